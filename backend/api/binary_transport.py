@@ -0,0 +1,200 @@
+"""
+msgpack-over-Unix-socket transport for internal callers
+
+Runs inside the API process and shares its loaded model, index and
+caches. Connections are accepted on the HTTP app's event loop, but each
+request is served on a small dedicated thread pool, so encoding a large
+batch never stalls HTTP requests. Each frame is a 4-byte big-endian
+length followed by a msgpack map.
+
+Request:  {"queries": ["...", ...], "field_weights": {...}}   (or {"query": "..."})
+Response: {"results": [[{"assessment_name": "...", "assessment_url": "..."}, ...], ...]}
+          or {"error": "..."}
+
+Batched requests encode all cache misses in one model call. Enable by
+setting RECOMMEND_SOCKET_PATH; "{pid}" in the path is replaced with the
+worker PID so several uvicorn workers can each listen on their own socket.
+"""
+
+import asyncio
+import os
+import socket
+import struct
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import msgpack
+
+from api import routes
+from utils import metrics
+
+SOCKET_PATH = os.getenv("RECOMMEND_SOCKET_PATH")
+MAX_FRAME_BYTES = 16 * 1024 * 1024
+MAX_BATCH_SIZE = int(os.getenv("RECOMMEND_SOCKET_MAX_BATCH", "256"))
+# Threads serving socket requests off the event loop
+SOCKET_WORKERS = int(os.getenv("RECOMMEND_SOCKET_WORKERS", "1"))
+
+_HEADER = struct.Struct(">I")
+
+_unix_in_flight = metrics.IN_FLIGHT.labels(endpoint="unix")
+_unix_latency = metrics.REQUEST_LATENCY.labels(endpoint="unix")
+_unix_errors = metrics.REQUEST_ERRORS.labels(endpoint="unix")
+
+_executor = ThreadPoolExecutor(max_workers=SOCKET_WORKERS, thread_name_prefix="recommend-socket")
+
+
+def resolve_socket_path(path: str = None) -> str:
+    """Expand the {pid} placeholder in the configured socket path"""
+    path = path or SOCKET_PATH
+    return path.replace("{pid}", str(os.getpid())) if path else None
+
+
+def handle_message(message: dict) -> dict:
+    """
+    Serve one decoded request with the shared /recommend pipeline
+
+    Returns:
+        Response map with "results" or "error"
+    """
+    if not isinstance(message, dict):
+        return {"error": "Request must be a map"}
+
+    queries = message.get("queries")
+    if queries is None and "query" in message:
+        queries = [message["query"]]
+    if not isinstance(queries, list) or not queries:
+        return {"error": "Request needs a non-empty 'queries' list"}
+    if len(queries) > MAX_BATCH_SIZE:
+        return {"error": f"Batch too large (max {MAX_BATCH_SIZE})"}
+    if not all(isinstance(query, str) and query.strip() for query in queries):
+        return {"error": "Query cannot be empty"}
+
+    if not routes.index_loaded:
+        routes.load_model_and_index()
+
+    field_weights = message.get("field_weights")
+    if field_weights is not None:
+        if routes.field_scorer is None:
+            return {"error": "Field weights need an index built with field embeddings"}
+        try:
+            routes.field_scorer.weight_vector(field_weights)
+        except ValueError as e:
+            return {"error": str(e)}
+
+    rankings = routes._recommend_batch([query.strip() for query in queries], field_weights)
+    assessment_data = routes.assessment_data
+    return {
+        "results": [
+            [
+                {"assessment_name": assessment_data[idx]['name'], "assessment_url": assessment_data[idx]['url']}
+                for idx in ranking
+            ]
+            for ranking in rankings
+        ]
+    }
+
+
+def _serve(payload: bytes) -> bytes:
+    """Decode, handle and encode one frame, recording metrics"""
+    _unix_in_flight.inc()
+    start = time.perf_counter()
+    status = "200"
+    try:
+        response = handle_message(msgpack.unpackb(payload, raw=False))
+        if "error" in response:
+            status = "400"
+    except Exception as e:
+        status = "500"
+        response = {"error": f"Error generating recommendations: {str(e)}"}
+    finally:
+        _unix_in_flight.dec()
+        _unix_latency.observe(time.perf_counter() - start)
+        metrics.REQUEST_COUNT.labels(endpoint="unix", status=status).inc()
+        if status != "200":
+            _unix_errors.inc()
+    return msgpack.packb(response, use_bin_type=True)
+
+
+async def _handle_connection(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+    """Serve frames on one connection until the client disconnects"""
+    loop = asyncio.get_running_loop()
+    try:
+        while True:
+            header = await reader.readexactly(_HEADER.size)
+            (length,) = _HEADER.unpack(header)
+            if length > MAX_FRAME_BYTES:
+                body = msgpack.packb({"error": "Frame too large"}, use_bin_type=True)
+                writer.write(_HEADER.pack(len(body)) + body)
+                await writer.drain()
+                break
+            payload = await reader.readexactly(length)
+            body = await loop.run_in_executor(_executor, _serve, payload)
+            writer.write(_HEADER.pack(len(body)) + body)
+            await writer.drain()
+    except (asyncio.IncompleteReadError, ConnectionResetError):
+        pass
+    finally:
+        writer.close()
+
+
+async def start_socket_server(path: str = None) -> asyncio.AbstractServer:
+    """
+    Start listening on the Unix socket
+
+    A stale socket file left by a previous run is removed first.
+    """
+    path = resolve_socket_path(path)
+    if os.path.exists(path):
+        os.unlink(path)
+    server = await asyncio.start_unix_server(_handle_connection, path=path)
+    print(f"Binary transport listening on {path}")
+    return server
+
+
+async def stop_socket_server(server: asyncio.AbstractServer, path: str = None):
+    """Close the server and remove its socket file"""
+    server.close()
+    await server.wait_closed()
+    path = resolve_socket_path(path)
+    if path and os.path.exists(path):
+        os.unlink(path)
+
+
+class RecommendClient:
+    """Blocking client for the Unix socket transport; keeps one connection open"""
+
+    def __init__(self, path: str, timeout: float = 30.0):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(timeout)
+        self.sock.connect(path)
+
+    def _recv_exactly(self, size: int) -> bytes:
+        chunks = []
+        while size > 0:
+            chunk = self.sock.recv(size)
+            if not chunk:
+                raise ConnectionError("Socket closed by server")
+            chunks.append(chunk)
+            size -= len(chunk)
+        return b"".join(chunks)
+
+    def call(self, message: dict) -> dict:
+        """Send one request map and return the response map"""
+        body = msgpack.packb(message, use_bin_type=True)
+        self.sock.sendall(_HEADER.pack(len(body)) + body)
+        (length,) = _HEADER.unpack(self._recv_exactly(_HEADER.size))
+        response = msgpack.unpackb(self._recv_exactly(length), raw=False)
+        if "error" in response:
+            raise RuntimeError(response["error"])
+        return response
+
+    def recommend(self, query: str) -> list:
+        """Recommendations for one query"""
+        return self.call({"queries": [query]})["results"][0]
+
+    def recommend_batch(self, queries: list) -> list:
+        """Recommendations for several queries in one round trip"""
+        return self.call({"queries": queries})["results"]
+
+    def close(self):
+        self.sock.close()
@@ -2,11 +2,16 @@
 API Routes for SHL Assessment Recommendation System
 """
 
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, Header, HTTPException, Response
+from fastapi.responses import FileResponse
 from pydantic import BaseModel
-from typing import List, Optional
+from typing import Dict, List, Optional
+import json
 import os
+import random
 import sys
+import threading
+import time
 
 # Add parent directory to path
 backend_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
@@ -14,20 +19,63 @@ sys.path.insert(0, backend_dir)
 
 from models.embedding_model import EmbeddingModel
 from utils.preprocess import DataPreprocessor
+from utils import metrics
+from utils import profiling
+from utils.query_cache import ExactQueryCache, SemanticQueryCache, ranking_overlap
+from utils import vectorstore
+from utils.sharded_index import ShardedIndex
+from utils.late_fusion import LateFusionScorer
+from utils.precompute import PrecomputedTable
 import faiss
 import numpy as np
 import pandas as pd
-import pickle
 
 router = APIRouter()
 
 # Global variables for model and index
 embedding_model = None
+bundle = None
 faiss_index = None
 assessment_data = None
+neighbor_ids = None
+neighbor_scores = None
+field_scorer = None
+url_to_id = None
+row_url_ids = None
+response_fragments = None
+precomputed_table = None
+exact_cache = None
+semantic_cache = None
+# Set only after every global above is populated; check this, not individual globals
+index_loaded = False
+
+# Socket transport threads may trigger the first load alongside HTTP requests
+_load_lock = threading.Lock()
+
+# Query cache settings
+QUERY_CACHE_SIZE = int(os.getenv("QUERY_CACHE_SIZE", "1024"))
+SEMANTIC_CACHE_ENABLED = os.getenv("SEMANTIC_CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+SEMANTIC_CACHE_SIZE = int(os.getenv("SEMANTIC_CACHE_SIZE", "1024"))
+SEMANTIC_CACHE_THRESHOLD = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.97"))
+SEMANTIC_CACHE_DRIFT_SAMPLE_RATE = float(os.getenv("SEMANTIC_CACHE_DRIFT_SAMPLE_RATE", "0.05"))
+PRECOMPUTED_TABLE_ENABLED = os.getenv("PRECOMPUTED_TABLE_ENABLED", "true").lower() in ("1", "true", "yes")
+
+# Catalog sharding: INDEX_SHARDS > 1 splits by URL hash, INDEX_SHARD_STRATEGY=type splits by test type
+INDEX_SHARDS = int(os.getenv("INDEX_SHARDS", "1"))
+INDEX_SHARD_STRATEGY = os.getenv("INDEX_SHARD_STRATEGY", "hash")
+
+# Metric children bound once so the request path skips label lookups
+_recommend_in_flight = metrics.IN_FLIGHT.labels(endpoint="/recommend")
+_recommend_latency = metrics.REQUEST_LATENCY.labels(endpoint="/recommend")
+_recommend_errors = metrics.REQUEST_ERRORS.labels(endpoint="/recommend")
+_precomputed_stats = metrics.CacheStats("precomputed")
+_exact_cache_stats = metrics.CacheStats("exact")
+_semantic_cache_stats = metrics.CacheStats("semantic")
 
 class QueryRequest(BaseModel):
     query: str
+    # Optional late-fusion weights, e.g. {"name": 0.2, "description": 0.6, "type": 0.2}
+    field_weights: Optional[Dict[str, float]] = None
 
 class RecommendationResponse(BaseModel):
     assessment_name: str
@@ -36,93 +84,390 @@ class RecommendationResponse(BaseModel):
 class RecommendationsResponse(BaseModel):
     recommendations: List[RecommendationResponse]
 
+class SimilarAssessmentResponse(BaseModel):
+    assessment_name: str
+    assessment_url: str
+    similarity: float
+
+class SimilarAssessmentsResponse(BaseModel):
+    assessment_url: str
+    similar: List[SimilarAssessmentResponse]
+
 def load_model_and_index():
-    """Load the embedding model and FAISS index"""
-    global embedding_model, faiss_index, assessment_data
+    """
+    Load the embedding model and FAISS index (once, even if called from several threads)
     
+    index_loaded is set last, so a caller that sees it True without taking
+    the lock also sees the caches, dedup tables and fragments.
+    """
+    global index_loaded
+    
+    with _load_lock:
+        if index_loaded:
+            return
+        with metrics.STAGE_MODEL_LOAD.time():
+            _load_model_and_index()
+        metrics.INDEX_SIZE.set(faiss_index.ntotal)
+        metrics.INDEX_INFO.info({
+            "version": bundle.version,
+            "model_name": bundle.manifest["model_name"] if bundle.manifest else embedding_model.model_name,
+        })
+        index_loaded = True
+
+def _load_model_and_index():
+    """Load model, index and assessment data into the module globals"""
+    global embedding_model, bundle, faiss_index, assessment_data, neighbor_ids, neighbor_scores, url_to_id
+    global exact_cache, semantic_cache, field_scorer, row_url_ids, response_fragments, precomputed_table
+
     if embedding_model is None:
         embedding_model = EmbeddingModel()
     
-    # Load FAISS index
-    index_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), "vectorstore", "faiss_index.bin")
-    data_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), "vectorstore", "assessment_data.pkl")
+    # Load the active vectorstore bundle (manifest checks are O(1), no hashing)
+    vectorstore_dir = os.path.join(os.path.dirname(os.path.dirname(__file__)), "vectorstore")
+    bundle = vectorstore.load_bundle(vectorstore_dir, expected_model=embedding_model.model_name)
     
-    if os.path.exists(index_path) and os.path.exists(data_path):
-        faiss_index = faiss.read_index(index_path)
-        with open(data_path, 'rb') as f:
-            assessment_data = pickle.load(f)
-    else:
+    if bundle is None:
         # Initialize if index doesn't exist
-        preprocessor = DataPreprocessor()
+        preprocessor = DataPreprocessor(embedding_model=embedding_model)
         preprocessor.build_index()
-        faiss_index = faiss.read_index(index_path)
-        with open(data_path, 'rb') as f:
-            assessment_data = pickle.load(f)
+        bundle = vectorstore.load_bundle(vectorstore_dir, expected_model=embedding_model.model_name)
+    
+    faiss_index = bundle.index
+    assessment_data = bundle.assessment_data
+    
+    if INDEX_SHARDS > 1 or INDEX_SHARD_STRATEGY == "type":
+        faiss_index = ShardedIndex.from_index(
+            bundle.index, assessment_data, strategy=INDEX_SHARD_STRATEGY, num_shards=INDEX_SHARDS
+        )
+        print(f"Catalog split into {len(faiss_index.shards)} shards ({INDEX_SHARD_STRATEGY})")
+    
+    # Neighbor table is optional for indexes built before it existed
+    neighbors = bundle.load_arrays("neighbors.npz")
+    if neighbors is not None:
+        neighbor_ids = neighbors['ids']
+        neighbor_scores = neighbors['scores']
+    else:
+        neighbor_ids = neighbor_scores = None
+    
+    # Per-field embeddings for late fusion, also optional for older bundles
+    field_scorer = LateFusionScorer.from_arrays(bundle.load_arrays("field_embeddings.npz"))
+    
+    # First catalog row wins for duplicate canonical URLs; every row maps to
+    # that row's ID so dedup compares ints instead of URL strings. Bundles
+    # built with URL groups already hold one row per URL.
+    url_to_id = {}
+    row_url_ids = []
+    for idx, assessment in enumerate(assessment_data):
+        key = DataPreprocessor.url_key(assessment['url'], idx)
+        row_url_ids.append(url_to_id.setdefault(key, idx))
+    
+    # Pre-serialized RecommendationResponse JSON per row, byte-identical to
+    # FastAPI's rendering of the Pydantic model
+    response_fragments = [
+        _serialize({"assessment_name": assessment['name'], "assessment_url": assessment['url']})
+        for assessment in assessment_data
+    ]
+    
+    # Rankings precomputed offline for known queries; ignored if built for another bundle
+    precomputed_table = None
+    if PRECOMPUTED_TABLE_ENABLED:
+        precomputed_table = PrecomputedTable.load(vectorstore_dir, bundle.version)
+    if precomputed_table is not None:
+        print(f"Loaded {len(precomputed_table)} precomputed rankings")
+    
+    # Fresh caches for the freshly loaded index
+    exact_cache = ExactQueryCache(QUERY_CACHE_SIZE)
+    semantic_cache = None
+    if SEMANTIC_CACHE_ENABLED:
+        semantic_cache = SemanticQueryCache(
+            faiss_index.d, capacity=SEMANTIC_CACHE_SIZE, threshold=SEMANTIC_CACHE_THRESHOLD
+        )
 
 @router.get("/health")
 async def health_check():
     """Health check endpoint"""
     return {"status": "running"}
 
+@router.get("/metrics")
+async def metrics_endpoint():
+    """Prometheus metrics endpoint"""
+    payload, content_type = metrics.render_metrics()
+    return Response(content=payload, media_type=content_type)
+
+def _serialize(content) -> bytes:
+    """Encode JSON the way Starlette's JSONResponse does"""
+    return json.dumps(content, ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode("utf-8")
+
+def _unique_ranking(indices) -> List[int]:
+    """Turn raw search hits into up to 10 catalog row IDs with unique URLs"""
+    seen_url_ids = set()
+    ranking = []
+    num_rows = len(row_url_ids)
+    for idx in indices.tolist():
+        if 0 <= idx < num_rows:
+            url_id = row_url_ids[idx]
+            if url_id not in seen_url_ids:
+                seen_url_ids.add(url_id)
+                ranking.append(idx)
+                if len(ranking) >= 10:
+                    break
+    return ranking
+
+def _render_recommendations(ranking: List[int]) -> bytes:
+    """Join pre-serialized fragments into a RecommendationsResponse JSON body"""
+    with metrics.STAGE_RESPONSE.time():
+        return b'{"recommendations":[' + b','.join([response_fragments[idx] for idx in ranking]) + b']}'
+
+def _search(query_embedding) -> List[int]:
+    """Search the catalog index and return a deduplicated ranking"""
+    with metrics.STAGE_SEARCH.time():
+        k = min(10, faiss_index.ntotal)
+        distances, indices = faiss_index.search(query_embedding, k)
+        return _unique_ranking(indices[0])
+
+def _encode_queries(queries: List[str]) -> np.ndarray:
+    """Encode and L2-normalize a batch of queries in one model call"""
+    with metrics.STAGE_ENCODE.time():
+        query_embeddings = embedding_model.encode(queries)
+        query_embeddings = np.ascontiguousarray(query_embeddings, dtype='float32')
+        
+        # Normalize for cosine similarity
+        faiss.normalize_L2(query_embeddings)
+    return query_embeddings
+
+def _rank_embedding(query: str, query_embedding: np.ndarray) -> List[int]:
+    """Semantic cache lookup, falling back to catalog search; fills both caches"""
+    ranking = None
+    if semantic_cache is not None:
+        ranking, similarity = semantic_cache.lookup(query_embedding)
+        if similarity is not None:
+            metrics.SEMANTIC_CACHE_SIMILARITY.observe(similarity)
+    
+    if ranking is None:
+        if semantic_cache is not None:
+            _semantic_cache_stats.miss()
+        ranking = _search(query_embedding)
+        if semantic_cache is not None:
+            semantic_cache.add(query_embedding, ranking)
+    else:
+        _semantic_cache_stats.hit()
+        # Occasionally compare against a fresh search to measure cache drift
+        if random.random() < SEMANTIC_CACHE_DRIFT_SAMPLE_RATE:
+            fresh = _search(query_embedding)
+            metrics.SEMANTIC_CACHE_DRIFT.observe(1.0 - ranking_overlap(ranking, fresh))
+    
+    exact_cache.put(query, ranking)
+    return ranking
+
+def _recommend_batch(queries: List[str], field_weights: Dict[str, float] = None) -> List[List[int]]:
+    """
+    Run the retrieval pipeline for a batch of queries, timing each stage
+    
+    The precomputed table and the exact-match cache are checked before
+    encoding and the semantic cache after encoding; any hit skips the
+    catalog search. All misses are encoded in one model call. Requests
+    with field weights are scored by late fusion and bypass the table and
+    caches, since their rankings depend on the weights.
+
+    Args:
+        queries: Stripped, non-empty query texts
+        field_weights: Optional late-fusion weights per field
+
+    Returns:
+        For each query, up to 10 catalog row IDs with unique URLs
+    """
+    if field_weights is not None:
+        query_embeddings = _encode_queries(queries)
+        with metrics.STAGE_SEARCH.time():
+            distances, indices = field_scorer.search(query_embeddings, 10, field_weights)
+            return [_unique_ranking(row) for row in indices]
+    
+    rankings = [None] * len(queries)
+    misses = []
+    for i, query in enumerate(queries):
+        if precomputed_table is not None:
+            ranking = precomputed_table.get(query)
+            if ranking is not None:
+                _precomputed_stats.hit()
+                rankings[i] = ranking
+                continue
+            _precomputed_stats.miss()
+        
+        ranking = exact_cache.get(query)
+        if ranking is not None:
+            _exact_cache_stats.hit()
+            rankings[i] = ranking
+        else:
+            _exact_cache_stats.miss()
+            misses.append(i)
+    
+    if misses:
+        query_embeddings = _encode_queries([queries[i] for i in misses])
+        for row, i in enumerate(misses):
+            rankings[i] = _rank_embedding(queries[i], query_embeddings[row:row + 1])
+    
+    return rankings
+
+def _recommend(query: str, field_weights: Dict[str, float] = None) -> List[int]:
+    """
+    Run the retrieval pipeline for a single query
+
+    Args:
+        query: Stripped, non-empty query text
+        field_weights: Optional late-fusion weights per field
+
+    Returns:
+        Up to 10 catalog row IDs with unique URLs
+    """
+    return _recommend_batch([query], field_weights)[0]
+
+def _profiled_recommend(query: str, field_weights: Optional[Dict[str, float]]) -> tuple:
+    """
+    Run _recommend under the request profiler and store the artifact
+    
+    Returns:
+        Tuple of (ranking, response headers identifying the profile)
+    """
+    with profiling.RequestProfiler() as profiler:
+        ranking = _recommend(query, field_weights)
+    
+    metadata = profiling.describe_input(embedding_model, query)
+    metadata["num_recommendations"] = len(ranking)
+    profile_id = profiler.save(metadata)
+    
+    headers = {
+        "X-Profile-Id": profile_id,
+        "Server-Timing": f"recommend;dur={profiler.elapsed * 1000.0:.3f}"
+    }
+    return ranking, headers
+
 @router.post("/recommend", response_model=RecommendationsResponse)
-async def get_recommendations(request: QueryRequest):
+async def get_recommendations(
+    request: QueryRequest,
+    x_profile: Optional[str] = Header(default=None),
+    x_admin_token: Optional[str] = Header(default=None)
+):
     """
     Get assessment recommendations based on query
+    
+    Send ``X-Profile: 1`` to profile the request when profiling is enabled
+    on the server; the stored profile ID is returned in ``X-Profile-Id``.
+    
+    The body is assembled from per-assessment JSON fragments serialized at
+    index load time, so no Pydantic models are built or validated per
+    request. response_model still documents the (identical) schema.
     """
     global embedding_model, faiss_index, assessment_data
     
+    _recommend_in_flight.inc()
+    start = time.perf_counter()
+    status = "200"
+    
     try:
         # Load model and index if not already loaded
-        if faiss_index is None or assessment_data is None:
+        if not index_loaded:
             load_model_and_index()
         
         if not request.query or not request.query.strip():
             raise HTTPException(status_code=400, detail="Query cannot be empty")
         
-        # Generate embedding for query
-        query_embedding = embedding_model.encode([request.query.strip()])
-        query_embedding = np.array(query_embedding, dtype='float32')
+        if request.field_weights is not None:
+            if field_scorer is None:
+                raise HTTPException(status_code=400, detail="Field weights need an index built with field embeddings")
+            try:
+                field_scorer.weight_vector(request.field_weights)
+            except ValueError as e:
+                raise HTTPException(status_code=400, detail=str(e))
         
-        # Normalize for cosine similarity
-        faiss.normalize_L2(query_embedding)
+        query = request.query.strip()
+        headers = None
+        if profiling.should_profile(x_profile, x_admin_token):
+            ranking, headers = _profiled_recommend(query, request.field_weights)
+        else:
+            ranking = _recommend(query, request.field_weights)
         
-        # Search in FAISS index (top 10)
-        k = min(10, faiss_index.ntotal)
-        distances, indices = faiss_index.search(query_embedding, k)
-        
-        # Get recommendations
-        recommendations = []
-        for idx in indices[0]:
-            if idx < len(assessment_data):
-                assessment = assessment_data[idx]
-                recommendations.append(
-                    RecommendationResponse(
-                        assessment_name=assessment['name'],
-                        assessment_url=assessment['url']
-                    )
-                )
-        
-        # Filter out duplicates and ensure we have 5-10 results
-        seen_urls = set()
-        unique_recommendations = []
-        for rec in recommendations:
-            if rec.assessment_url not in seen_urls:
-                seen_urls.add(rec.assessment_url)
-                unique_recommendations.append(rec)
-                if len(unique_recommendations) >= 10:
-                    break
-        
-        # Ensure at least 5 recommendations
-        if len(unique_recommendations) < 5 and len(recommendations) >= 5:
-            # Add more if available
-            for rec in recommendations:
-                if rec.assessment_url not in seen_urls:
-                    unique_recommendations.append(rec)
-                    if len(unique_recommendations) >= 5:
-                        break
-        
-        return RecommendationsResponse(recommendations=unique_recommendations)
+        return Response(content=_render_recommendations(ranking), media_type="application/json", headers=headers)
+    
+    except HTTPException as e:
+        status = str(e.status_code)
+        _recommend_errors.inc()
+        raise
     
     except Exception as e:
+        status = "500"
+        _recommend_errors.inc()
         raise HTTPException(status_code=500, detail=f"Error generating recommendations: {str(e)}")
+    
+    finally:
+        _recommend_in_flight.dec()
+        _recommend_latency.observe(time.perf_counter() - start)
+        metrics.REQUEST_COUNT.labels(endpoint="/recommend", status=status).inc()
 
+@router.get("/similar", response_model=SimilarAssessmentsResponse)
+async def get_similar(url: str, k: int = 10):
+    """
+    Get assessments similar to a catalog assessment
+    
+    Reads the neighbor table precomputed by DataPreprocessor.build_index, so
+    no query encoding or index search happens per request.
+    """
+    if not index_loaded:
+        load_model_and_index()
+    
+    if neighbor_ids is None:
+        raise HTTPException(status_code=503, detail="Neighbor table not built. Rebuild the index.")
+    
+    try:
+        source_id = url_to_id.get(DataPreprocessor.canonicalize_url(url))
+    except ValueError:
+        # Malformed URLs (e.g. an unclosed IPv6 host) cannot be in the catalog
+        source_id = None
+    if source_id is None:
+        raise HTTPException(status_code=404, detail="Assessment URL not found in catalog")
+    
+    k = max(1, min(k, neighbor_ids.shape[1]))
+    seen_urls = {assessment_data[source_id]['url']}
+    similar = []
+    for idx, score in zip(neighbor_ids[source_id], neighbor_scores[source_id]):
+        if idx < 0:
+            break
+        assessment = assessment_data[idx]
+        if assessment['url'] in seen_urls:
+            continue
+        seen_urls.add(assessment['url'])
+        similar.append(
+            SimilarAssessmentResponse(
+                assessment_name=assessment['name'],
+                assessment_url=assessment['url'],
+                similarity=float(score)
+            )
+        )
+        if len(similar) >= k:
+            break
+    
+    return SimilarAssessmentsResponse(assessment_url=assessment_data[source_id]['url'], similar=similar)
+
+@router.get("/admin/profiles/{profile_id}")
+async def get_profile(profile_id: str, x_admin_token: Optional[str] = Header(default=None)):
+    """Return stored metadata (timing, token length, thread usage) for a profile"""
+    if not profiling.is_authorized(x_admin_token):
+        raise HTTPException(status_code=403, detail="Profiling is not enabled")
+    
+    record = profiling.load_profile(profile_id)
+    if record is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    record.pop("artifact_path")
+    return record
+
+@router.get("/admin/profiles/{profile_id}/artifact")
+async def get_profile_artifact(profile_id: str, x_admin_token: Optional[str] = Header(default=None)):
+    """Download the flame graph (HTML) or pstats file for a profile"""
+    if not profiling.is_authorized(x_admin_token):
+        raise HTTPException(status_code=403, detail="Profiling is not enabled")
+    
+    record = profiling.load_profile(profile_id)
+    if record is None or not os.path.exists(record["artifact_path"]):
+        raise HTTPException(status_code=404, detail="Profile not found")
+    
+    media_type = "text/html" if record["backend"] == "pyinstrument" else "application/octet-stream"
+    return FileResponse(record["artifact_path"], media_type=media_type, filename=record["artifact"])
@@ -13,6 +13,8 @@ from dotenv import load_dotenv
 
 from api.routes import router
 from utils.evaluator import Evaluator
+from utils import metrics
+from utils import thread_tuning
 
 load_dotenv()
 
@@ -34,6 +36,31 @@ app.add_middleware(
 # Include API routes
 app.include_router(router)
 
+@app.on_event("startup")
+async def apply_thread_settings():
+    """Apply tuned torch/FAISS thread counts before the model is loaded"""
+    settings = thread_tuning.apply_thread_settings()
+    metrics.THREAD_CONFIG.info({key: str(value) for key, value in settings.items()})
+    print(f"Thread settings: {settings}")
+
+# Optional msgpack-over-Unix-socket transport for internal callers
+socket_server = None
+
+@app.on_event("startup")
+async def start_binary_transport():
+    """Start the Unix socket transport when RECOMMEND_SOCKET_PATH is set"""
+    global socket_server
+    if os.getenv("RECOMMEND_SOCKET_PATH"):
+        from api.binary_transport import start_socket_server
+        socket_server = await start_socket_server()
+
+@app.on_event("shutdown")
+async def stop_binary_transport():
+    """Close the Unix socket transport"""
+    if socket_server is not None:
+        from api.binary_transport import stop_socket_server
+        await stop_socket_server(socket_server)
+
 @app.get("/")
 async def root():
     """Root endpoint"""
@@ -42,8 +69,11 @@ async def root():
         "version": "1.0.0",
         "endpoints": {
             "/health": "Health check endpoint",
-            "/recommend": "Get assessment recommendations"
-        }
+            "/recommend": "Get assessment recommendations",
+            "/similar": "Get assessments similar to a catalog assessment URL",
+            "/metrics": "Prometheus metrics"
+        },
+        "threads": thread_tuning.current_settings()
     }
 
 if __name__ == "__main__":
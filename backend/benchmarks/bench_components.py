@@ -0,0 +1,97 @@
+"""
+Component microbenchmarks for encoder, index and evaluator hot paths
+
+Requires pytest-benchmark. Run from the backend directory:
+  pytest benchmarks/bench_components.py --benchmark-only
+  pytest benchmarks/bench_components.py --benchmark-json=components.json
+  pytest benchmarks/bench_components.py --benchmark-compare   # against the last saved run
+
+Catalog sizes for the FAISS benchmarks go up to BENCH_MAX_CATALOG vectors
+(default 1,000,000). Set BENCH_MODEL to time a real local Sentence-BERT
+model instead of the stub encoder.
+"""
+
+import os
+
+import faiss
+import numpy as np
+import pytest
+
+from conftest import DIMENSION, make_text, make_vectors
+from utils.evaluator import Evaluator
+from utils.preprocess import DataPreprocessor
+from utils.sharded_index import ShardedIndex
+
+MAX_CATALOG = int(os.getenv("BENCH_MAX_CATALOG", 1_000_000))
+CATALOG_SIZES = [n for n in (1_000, 10_000, 100_000, 1_000_000) if n <= MAX_CATALOG]
+
+_index_cache = {}
+
+
+def flat_index(num_vectors: int) -> faiss.IndexFlatIP:
+    """Build (once per session) an IndexFlatIP over random unit vectors"""
+    if num_vectors not in _index_cache:
+        index = faiss.IndexFlatIP(DIMENSION)
+        index.add(make_vectors(num_vectors))
+        _index_cache[num_vectors] = index
+    return _index_cache[num_vectors]
+
+
+@pytest.mark.parametrize("batch_size", [1, 8, 32, 128, 256])
+def test_encode_batch_size(benchmark, encoder, batch_size):
+    benchmark.group = "encode-batch-size"
+    rng = np.random.default_rng(0)
+    texts = [make_text(rng, 50) for _ in range(batch_size)]
+    benchmark(encoder.encode, texts)
+
+
+@pytest.mark.parametrize("num_words", [8, 32, 128, 512])
+def test_encode_input_length(benchmark, encoder, num_words):
+    benchmark.group = "encode-input-length"
+    rng = np.random.default_rng(0)
+    texts = [make_text(rng, num_words)]
+    benchmark(encoder.encode, texts)
+
+
+@pytest.mark.parametrize("k", [1, 10, 100])
+@pytest.mark.parametrize("num_vectors", CATALOG_SIZES)
+def test_faiss_search(benchmark, num_vectors, k):
+    benchmark.group = f"faiss-search-k{k}"
+    index = flat_index(num_vectors)
+    query = make_vectors(1, seed=42)
+    benchmark(index.search, query, k)
+
+
+@pytest.mark.parametrize("num_shards", [1, 2, 4, 8])
+@pytest.mark.parametrize("num_vectors", [n for n in CATALOG_SIZES if n >= 100_000] or CATALOG_SIZES[-1:])
+def test_sharded_search(benchmark, num_vectors, num_shards):
+    benchmark.group = f"sharded-search-{num_vectors}"
+    vectors = flat_index(num_vectors).reconstruct_n(0, num_vectors)
+    partition = np.arange(num_vectors) % num_shards
+    index = ShardedIndex.from_vectors(vectors, partition)
+    query = make_vectors(1, seed=42)
+    try:
+        benchmark(index.search, query, 10)
+    finally:
+        index.close()
+
+
+@pytest.mark.parametrize("num_items", [100, 1_000, 10_000])
+def test_build_index(benchmark, synthetic_workspace, num_items):
+    benchmark.group = "build-index"
+    workspace = synthetic_workspace(num_items)
+    preprocessor = DataPreprocessor(
+        embedding_model=workspace["embedding_model"],
+        data_dir=workspace["data_dir"],
+        vectorstore_dir=workspace["vectorstore_dir"],
+    )
+    benchmark.pedantic(preprocessor.build_index, rounds=3, iterations=1)
+
+
+@pytest.mark.parametrize("num_items", [100, 1_000, 10_000])
+def test_evaluate(benchmark, synthetic_workspace, num_items):
+    benchmark.group = "evaluate"
+    workspace = synthetic_workspace(num_items)
+    evaluator = Evaluator(**workspace)
+    evaluator.load_index_and_data()  # build once outside the timed region
+    benchmark.pedantic(evaluator.evaluate, kwargs={"k": 10}, rounds=3, iterations=1)
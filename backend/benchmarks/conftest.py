@@ -0,0 +1,22 @@
+"""
+Shared fixtures for component microbenchmarks
+
+Everything here runs offline: encoders are a deterministic hashing stub
+unless BENCH_MODEL names a locally cached Sentence-BERT model.
+"""
+
+import os
+import sys
+
+# Add backend directory to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from tests.synthetic import (  # noqa: F401  (re-exported for bench modules and as fixtures)
+    DIMENSION,
+    StubEncoder,
+    encoder,
+    make_catalog,
+    make_text,
+    make_vectors,
+    synthetic_workspace,
+)
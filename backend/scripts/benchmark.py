@@ -0,0 +1,354 @@
+"""
+Load-test and latency benchmark for the /recommend endpoint
+
+Drives the API with an async client either in-process (ASGI transport, no
+network) or against a local uvicorn server, at a fixed concurrency or a
+target request rate. Writes a JSON report so runs can be diffed between
+commits, and optionally fails if a run regresses against a baseline report.
+In-process runs sample CPU/RSS of the process that also generates the load;
+use the uvicorn target for server-only numbers. Query caches and the
+precomputed table are disabled unless --with-caches is given, and reports
+with different cache modes are never compared.
+
+Examples:
+  python scripts/benchmark.py --concurrency 8 --duration 30
+  python scripts/benchmark.py --target uvicorn --rps 50 --output bench.json
+  python scripts/benchmark.py --baseline bench.json --tolerance 0.10
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+
+import httpx
+import numpy as np
+import psutil
+
+# Add parent directory to path
+backend_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(backend_dir)
+
+from utils.evaluator import load_query_corpus
+
+# Metrics where a higher value is a regression
+LOWER_IS_BETTER = ["latency_p50_ms", "latency_p95_ms", "latency_p99_ms", "rss_max_mb"]
+# Metrics where a lower value is a regression
+HIGHER_IS_BETTER = ["throughput_rps"]
+# Served-response caches are off by default so measured requests exercise the
+# encoder and FAISS search instead of replaying warm-up queries from cache
+CACHES_OFF_ENV = {
+    "QUERY_CACHE_SIZE": "0",
+    "SEMANTIC_CACHE_ENABLED": "false",
+    "PRECOMPUTED_TABLE_ENABLED": "false",
+}
+# Only comparable between runs that sampled the same process (see resource_scope)
+RESOURCE_METRICS = ["rss_max_mb"]
+
+
+class ResourceSampler:
+    """Samples CPU time and RSS of the process serving the requests"""
+
+    def __init__(self, pid: int, interval: float = 0.25):
+        self.process = psutil.Process(pid)
+        self.interval = interval
+        self.rss_samples = []
+        self._task = None
+        self._cpu_start = None
+        self._wall_start = None
+
+    async def _run(self):
+        while True:
+            self.rss_samples.append(self.process.memory_info().rss)
+            await asyncio.sleep(self.interval)
+
+    def start(self):
+        cpu = self.process.cpu_times()
+        self._cpu_start = cpu.user + cpu.system
+        self._wall_start = time.perf_counter()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> dict:
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        cpu = self.process.cpu_times()
+        cpu_seconds = cpu.user + cpu.system - self._cpu_start
+        wall = time.perf_counter() - self._wall_start
+        rss_mb = np.array(self.rss_samples or [self.process.memory_info().rss]) / (1024 * 1024)
+        return {
+            "cpu_seconds": round(cpu_seconds, 3),
+            "cpu_percent": round(100.0 * cpu_seconds / wall, 1) if wall > 0 else 0.0,
+            "rss_mean_mb": round(float(rss_mb.mean()), 1),
+            "rss_max_mb": round(float(rss_mb.max()), 1),
+        }
+
+
+async def _send(client: httpx.AsyncClient, query: str, results: list, scheduled: float = None):
+    """Send one request and record (latency, ok)"""
+    start = scheduled if scheduled is not None else time.perf_counter()
+    try:
+        response = await client.post("/recommend", json={"query": query})
+        ok = response.status_code == 200
+    except httpx.HTTPError:
+        ok = False
+    results.append((time.perf_counter() - start, ok))
+
+
+async def run_fixed_concurrency(client, queries: list, concurrency: int, duration: float) -> list:
+    """Closed loop: `concurrency` workers send back-to-back requests until the deadline"""
+    results = []
+    deadline = time.perf_counter() + duration
+    counter = iter(range(sys.maxsize))
+
+    async def worker():
+        while time.perf_counter() < deadline:
+            await _send(client, queries[next(counter) % len(queries)], results)
+
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return results
+
+
+async def run_target_rps(client, queries: list, rps: float, duration: float) -> list:
+    """
+    Open loop: issue requests on a fixed schedule regardless of completions
+
+    Latency is measured from the scheduled send time so queueing delay is
+    included (avoids coordinated omission).
+    """
+    results = []
+    tasks = []
+    interval = 1.0 / rps
+    start = time.perf_counter()
+    total = int(rps * duration)
+
+    for i in range(total):
+        scheduled = start + i * interval
+        delay = scheduled - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        tasks.append(asyncio.create_task(
+            _send(client, queries[i % len(queries)], results, scheduled=scheduled)
+        ))
+
+    await asyncio.gather(*tasks)
+    return results
+
+
+def summarize(results: list, wall_seconds: float) -> dict:
+    """Compute throughput and latency percentiles from (latency, ok) pairs"""
+    latencies = np.array([lat for lat, ok in results if ok]) * 1000.0
+    errors = sum(1 for _, ok in results if not ok)
+
+    summary = {
+        "requests": len(results),
+        "errors": errors,
+        "error_rate": round(errors / len(results), 4) if results else 0.0,
+        "wall_seconds": round(wall_seconds, 3),
+        "throughput_rps": round(len(latencies) / wall_seconds, 2) if wall_seconds > 0 else 0.0,
+    }
+    if len(latencies) > 0:
+        p50, p95, p99 = np.percentile(latencies, [50, 95, 99])
+        summary.update({
+            "latency_mean_ms": round(float(latencies.mean()), 3),
+            "latency_p50_ms": round(float(p50), 3),
+            "latency_p95_ms": round(float(p95), 3),
+            "latency_p99_ms": round(float(p99), 3),
+            "latency_max_ms": round(float(latencies.max()), 3),
+        })
+    return summary
+
+
+def start_uvicorn(port: int, env: dict = None) -> subprocess.Popen:
+    """Start a local uvicorn server and wait for /health"""
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app:app", "--host", "127.0.0.1", "--port", str(port)],
+        cwd=backend_dir,
+        env={**os.environ, **(env or {})},
+    )
+    url = f"http://127.0.0.1:{port}/health"
+    for _ in range(120):
+        if proc.poll() is not None:
+            raise RuntimeError("uvicorn exited during startup")
+        try:
+            if httpx.get(url, timeout=1.0).status_code == 200:
+                return proc
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.5)
+    proc.terminate()
+    raise RuntimeError("uvicorn did not become healthy within 60s")
+
+
+def git_commit() -> str:
+    """Return the current git commit hash, or 'unknown'"""
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=backend_dir, stderr=subprocess.DEVNULL
+        ).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def compare_to_baseline(current: dict, baseline: dict, tolerance: float) -> list:
+    """
+    Compare two benchmark reports
+
+    Returns:
+        List of human-readable regression descriptions (empty if none)
+    """
+    # Reports from before the cache mode was recorded ran with caches on
+    cur_caches = current["config"].get("caches", "on")
+    base_caches = baseline["config"].get("caches", "on")
+    if cur_caches != base_caches:
+        return [f"cache mode differs (baseline {base_caches}, current {cur_caches}); runs are not comparable"]
+
+    regressions = []
+    cur, base = current["results"], baseline["results"]
+    same_scope = cur.get("resource_scope") == base.get("resource_scope")
+    if not same_scope:
+        print(f"  CPU/RSS not compared: resource scope {base.get('resource_scope')} -> {cur.get('resource_scope')}")
+    for key in LOWER_IS_BETTER + HIGHER_IS_BETTER:
+        if key not in cur or key not in base or not base[key]:
+            continue
+        if key in RESOURCE_METRICS and not same_scope:
+            continue
+        change = (cur[key] - base[key]) / base[key]
+        worse = change > tolerance if key in LOWER_IS_BETTER else change < -tolerance
+        print(f"  {key:>18}: {base[key]:>10} -> {cur[key]:>10} ({change:+.1%})")
+        if worse:
+            regressions.append(f"{key} changed {change:+.1%} (tolerance {tolerance:.0%})")
+    return regressions
+
+
+async def run(args) -> dict:
+    queries = load_query_corpus(os.path.join(backend_dir, "data"))
+    server = None
+    lifespan = None
+
+    cache_env = {} if args.with_caches else CACHES_OFF_ENV
+    caches = "on" if args.with_caches else "off"
+
+    if args.target == "inprocess":
+        # Cache settings are read when api.routes is imported
+        os.environ.update(cache_env)
+        from app import app
+        # ASGITransport does not send lifespan events; run the startup hooks
+        # (thread settings, socket transport) as uvicorn would
+        lifespan = app.router.lifespan_context(app)
+        await lifespan.__aenter__()
+        transport = httpx.ASGITransport(app=app)
+        client = httpx.AsyncClient(transport=transport, base_url="http://benchmark")
+        # The load generator shares this process, so CPU/RSS cover client and server
+        pid = os.getpid()
+        resource_scope = "client+server"
+    else:
+        if args.url:
+            base_url, pid = args.url, args.server_pid
+            caches = "unknown"
+        else:
+            server = start_uvicorn(args.port, env=cache_env)
+            base_url, pid = f"http://127.0.0.1:{args.port}", server.pid
+        resource_scope = "server"
+        limits = httpx.Limits(max_connections=max(args.concurrency, 100))
+        client = httpx.AsyncClient(base_url=base_url, limits=limits, timeout=60.0)
+
+    try:
+        # Warm up: first request loads the model and index
+        for query in queries[:args.warmup]:
+            await client.post("/recommend", json={"query": query})
+
+        sampler = ResourceSampler(pid) if pid else None
+        if sampler:
+            sampler.start()
+        start = time.perf_counter()
+        if args.rps:
+            results = await run_target_rps(client, queries, args.rps, args.duration)
+        else:
+            results = await run_fixed_concurrency(client, queries, args.concurrency, args.duration)
+        wall = time.perf_counter() - start
+        resources = await sampler.stop() if sampler else {}
+    finally:
+        await client.aclose()
+        if lifespan is not None:
+            await lifespan.__aexit__(None, None, None)
+        if server is not None:
+            server.terminate()
+            server.wait()
+
+    summary = summarize(results, wall)
+    if resources:
+        summary.update(resources)
+        summary["resource_scope"] = resource_scope
+
+    return {
+        "commit": git_commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "host": {
+            "platform": platform.platform(),
+            "python": platform.python_version(),
+            "cpu_count": os.cpu_count(),
+        },
+        "config": {
+            "target": args.target if not args.url else args.url,
+            "mode": "rps" if args.rps else "concurrency",
+            "concurrency": None if args.rps else args.concurrency,
+            "rps": args.rps,
+            "duration": args.duration,
+            "num_queries": len(queries),
+            "caches": caches,
+        },
+        "results": summary,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the /recommend endpoint")
+    parser.add_argument("--target", choices=["inprocess", "uvicorn"], default="inprocess",
+                        help="Run the app in-process via ASGI, or against a local uvicorn")
+    parser.add_argument("--url", help="Benchmark an already running server instead of starting one")
+    parser.add_argument("--server-pid", type=int, help="PID of --url server for CPU/RSS sampling")
+    parser.add_argument("--port", type=int, default=8765, help="Port for the spawned uvicorn")
+    parser.add_argument("--concurrency", type=int, default=8, help="Concurrent clients (closed loop)")
+    parser.add_argument("--rps", type=float, help="Target requests per second (open loop)")
+    parser.add_argument("--duration", type=float, default=20.0, help="Measurement duration in seconds")
+    parser.add_argument("--warmup", type=int, default=3, help="Warm-up requests before measuring")
+    parser.add_argument("--with-caches", action="store_true",
+                        help="Keep the exact/semantic caches and precomputed table enabled")
+    parser.add_argument("--output", help="Write the JSON report to this path")
+    parser.add_argument("--baseline", help="Baseline JSON report to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.10,
+                        help="Allowed relative regression vs baseline (default 0.10)")
+    args = parser.parse_args()
+    if args.url:
+        args.target = "uvicorn"
+
+    report = asyncio.run(run(args))
+    print(json.dumps(report, indent=2))
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"Report saved to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        print(f"\nComparison against {args.baseline} (commit {baseline.get('commit')}):")
+        regressions = compare_to_baseline(report, baseline, args.tolerance)
+        if regressions:
+            print("Regressions detected:")
+            for regression in regressions:
+                print(f"  - {regression}")
+            sys.exit(1)
+        print("No regressions beyond tolerance.")
+
+
+if __name__ == "__main__":
+    main()
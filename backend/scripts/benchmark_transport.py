@@ -0,0 +1,115 @@
+"""
+Per-call overhead benchmark: HTTP/JSON vs msgpack over a Unix socket
+
+Starts a local uvicorn with the binary transport enabled, then sends the
+same queries sequentially over a keep-alive HTTP connection and over the
+Unix socket, and finally as one batched socket call. Queries are repeated
+so after warm-up they are served from the query cache, which isolates
+transport and serialization cost from model time.
+
+Usage:
+  python scripts/benchmark_transport.py --calls 2000 --batch-size 32 --output transport.json
+"""
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+import httpx
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmark import git_commit, load_query_corpus, start_uvicorn
+from api.binary_transport import RecommendClient
+
+backend_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def time_calls(fn, queries: list, calls: int) -> np.ndarray:
+    """Call fn(query) sequentially and return per-call latencies in microseconds"""
+    latencies = np.empty(calls)
+    for i in range(calls):
+        start = time.perf_counter()
+        fn(queries[i % len(queries)])
+        latencies[i] = (time.perf_counter() - start) * 1e6
+    return latencies
+
+
+def describe(latencies: np.ndarray) -> dict:
+    p50, p95, p99 = np.percentile(latencies, [50, 95, 99])
+    return {
+        "calls": len(latencies),
+        "mean_us": round(float(latencies.mean()), 1),
+        "p50_us": round(float(p50), 1),
+        "p95_us": round(float(p95), 1),
+        "p99_us": round(float(p99), 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare HTTP/JSON and Unix socket per-call overhead")
+    parser.add_argument("--calls", type=int, default=1000, help="Sequential calls per transport")
+    parser.add_argument("--batch-size", type=int, default=32, help="Queries per batched socket call")
+    parser.add_argument("--port", type=int, default=8766, help="Port for the spawned uvicorn")
+    parser.add_argument("--output", help="Write the JSON report to this path")
+    args = parser.parse_args()
+
+    queries = load_query_corpus(os.path.join(backend_dir, "data"))
+    socket_path = os.path.join(tempfile.mkdtemp(), "recommend.sock")
+    server = start_uvicorn(args.port, env={"RECOMMEND_SOCKET_PATH": socket_path})
+
+    try:
+        http = httpx.Client(base_url=f"http://127.0.0.1:{args.port}", timeout=60.0)
+        client = RecommendClient(socket_path)
+
+        # Warm up: load the model and fill the query cache
+        for query in queries:
+            http.post("/recommend", json={"query": query}).raise_for_status()
+            client.recommend(query)
+
+        def http_call(query):
+            http.post("/recommend", json={"query": query}).json()
+
+        http_latencies = time_calls(http_call, queries, args.calls)
+        socket_latencies = time_calls(client.recommend, queries, args.calls)
+
+        batch = [queries[i % len(queries)] for i in range(args.batch_size)]
+        batch_calls = max(1, args.calls // args.batch_size)
+        batch_latencies = time_calls(lambda _: client.recommend_batch(batch), batch, batch_calls)
+
+        http.close()
+        client.close()
+    finally:
+        server.terminate()
+        server.wait()
+
+    http_stats = describe(http_latencies)
+    socket_stats = describe(socket_latencies)
+    batch_stats = describe(batch_latencies)
+    batch_stats["per_query_mean_us"] = round(batch_stats["mean_us"] / args.batch_size, 1)
+
+    report = {
+        "commit": git_commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "config": {"calls": args.calls, "batch_size": args.batch_size, "num_queries": len(queries)},
+        "results": {
+            "http_json": http_stats,
+            "unix_msgpack": socket_stats,
+            "unix_msgpack_batched": batch_stats,
+            "p50_speedup": round(http_stats["p50_us"] / socket_stats["p50_us"], 2),
+        },
+    }
+    print(json.dumps(report, indent=2))
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"Report saved to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -5,6 +5,10 @@ Run this after starting the server: python app.py
 
 import requests
 import json
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
 BASE_URL = "http://localhost:8000"
 
@@ -60,6 +64,41 @@ def test_recommend():
     print("\n✅ All recommendation tests passed!\n")
     return True
 
+def test_recommend_contract():
+    """Check /recommend output matches the RecommendationsResponse schema byte for byte"""
+    from api.routes import RecommendationsResponse
+    
+    print("Testing /recommend response contract...")
+    query = "Hiring for a Python developer with strong communication skills"
+    try:
+        response = requests.post(f"{BASE_URL}/recommend", json={"query": query})
+        assert response.status_code == 200, response.text
+        assert response.headers["content-type"] == "application/json"
+        
+        data = response.json()
+        assert set(data.keys()) == {"recommendations"}
+        assert 1 <= len(data["recommendations"]) <= 10
+        for rec in data["recommendations"]:
+            assert set(rec.keys()) == {"assessment_name", "assessment_url"}
+            assert isinstance(rec["assessment_name"], str)
+            assert isinstance(rec["assessment_url"], str)
+        urls = [rec["assessment_url"] for rec in data["recommendations"]]
+        assert len(urls) == len(set(urls)), "duplicate URLs in response"
+        
+        # The fast path must serialize exactly as FastAPI would render the model
+        model = RecommendationsResponse.model_validate(data)
+        assert model.model_dump_json().encode("utf-8") == response.content
+        
+        # Empty queries are rejected with the documented error shape
+        response = requests.post(f"{BASE_URL}/recommend", json={"query": "  "})
+        assert response.status_code == 400
+        assert "detail" in response.json()
+        print("✅ Contract test passed!\n")
+        return True
+    except Exception as e:
+        print(f"❌ Contract test failed: {e}\n")
+        return False
+
 if __name__ == "__main__":
     print("=" * 60)
     print("SHL Assessment Recommendation API - Test Suite")
@@ -69,7 +108,7 @@ if __name__ == "__main__":
     
     health_ok = test_health()
     if health_ok:
-        recommend_ok = test_recommend()
+        recommend_ok = test_recommend() and test_recommend_contract()
         if recommend_ok:
             print("=" * 60)
             print("✅ All tests passed! API is working correctly.")
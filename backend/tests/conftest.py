@@ -0,0 +1,14 @@
+"""
+Shared fixtures for the offline tests
+
+Run from the backend directory:
+  pytest
+"""
+
+import os
+import sys
+
+# Add backend directory to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from tests.synthetic import encoder, synthetic_workspace  # noqa: F401  (fixtures)
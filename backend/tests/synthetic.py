@@ -0,0 +1,119 @@
+"""
+Synthetic catalogs, vectors and an offline stub encoder
+
+Shared by the tests and the component microbenchmarks, so neither needs a
+model download or the real catalog. Encoders are a deterministic hashing
+stub unless BENCH_MODEL names a locally cached Sentence-BERT model.
+"""
+
+import hashlib
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+DIMENSION = 384
+WORDS = (
+    "python java sql excel leadership communication numerical verbal reasoning "
+    "personality sales manager analyst engineer developer customer service "
+    "teamwork problem solving accounting finance data cloud security"
+).split()
+
+
+class StubEncoder:
+    """
+    Feature-hashing encoder with the EmbeddingModel interface
+
+    Cost grows with batch size and input length, like a real encoder, but it
+    needs no model download. Output rows are L2-normalized float32.
+    """
+
+    def __init__(self, dimension: int = DIMENSION):
+        self.dimension = dimension
+        self.model_name = "stub-hashing"
+
+    def encode(self, texts):
+        if isinstance(texts, str):
+            texts = [texts]
+        embeddings = np.zeros((len(texts), self.dimension), dtype='float32')
+        for row, text in enumerate(texts):
+            for token in text.lower().split():
+                digest = hashlib.blake2b(token.encode(), digest_size=8).digest()
+                bucket = int.from_bytes(digest[:4], 'little') % self.dimension
+                sign = 1.0 if digest[4] & 1 else -1.0
+                embeddings[row, bucket] += sign
+        norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return embeddings / norms
+
+    def encode_batch(self, texts, batch_size=32):
+        return self.encode(texts)
+
+
+def make_text(rng: np.random.Generator, num_words: int) -> str:
+    """Build a pseudo job-description string of the given length"""
+    return " ".join(rng.choice(WORDS, size=num_words))
+
+
+def make_catalog(num_items: int, seed: int = 0) -> pd.DataFrame:
+    """Build a synthetic catalog DataFrame with the crawler's columns"""
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        'name': [f"Assessment {i}" for i in range(num_items)],
+        'url': [f"https://www.shl.com/products/product-catalog/view/item-{i}/" for i in range(num_items)],
+        'description': [make_text(rng, 30) for _ in range(num_items)],
+        'type': rng.choice(['K', 'P'], size=num_items),
+    })
+
+
+def make_vectors(num_vectors: int, dimension: int = DIMENSION, seed: int = 0) -> np.ndarray:
+    """Random unit vectors, float32"""
+    rng = np.random.default_rng(seed)
+    vectors = rng.standard_normal((num_vectors, dimension), dtype=np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors
+
+
+@pytest.fixture(scope="session")
+def encoder():
+    """Stub encoder, or a real local model when BENCH_MODEL is set"""
+    model_name = os.getenv("BENCH_MODEL")
+    if model_name:
+        from models.embedding_model import EmbeddingModel
+        return EmbeddingModel(model_name)
+    return StubEncoder()
+
+
+@pytest.fixture
+def synthetic_workspace(tmp_path, encoder):
+    """
+    Temporary data/vectorstore/docs directories populated with a synthetic
+    catalog and labeled queries. Returns a factory taking the catalog size.
+    """
+    def build(num_items: int, num_queries: int = 50):
+        data_dir = tmp_path / "data"
+        vectorstore_dir = tmp_path / "vectorstore"
+        docs_dir = tmp_path / "docs"
+        for directory in (data_dir, vectorstore_dir, docs_dir):
+            directory.mkdir(exist_ok=True)
+
+        catalog = make_catalog(num_items)
+        catalog.to_csv(data_dir / "shl_catalog.csv", index=False)
+
+        rng = np.random.default_rng(1)
+        rows = []
+        for q in range(num_queries):
+            query = make_text(rng, 20)
+            for url in rng.choice(catalog['url'], size=3, replace=False):
+                rows.append({'Query': query, 'Assessment_url': url})
+        pd.DataFrame(rows).to_csv(data_dir / "labeled_train.csv", index=False)
+
+        return {
+            "embedding_model": encoder,
+            "data_dir": str(data_dir),
+            "vectorstore_dir": str(vectorstore_dir),
+            "docs_dir": str(docs_dir),
+        }
+
+    return build
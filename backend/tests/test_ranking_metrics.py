@@ -0,0 +1,66 @@
+"""
+Checks that the vectorized ranking metrics match the Evaluator helpers
+
+Run from the backend directory:
+  pytest tests/test_ranking_metrics.py
+"""
+
+import numpy as np
+import pytest
+
+from utils import ranking_metrics
+from utils.evaluator import Evaluator
+
+NUM_ITEMS = 20
+
+
+def random_cases(num_queries: int, k: int, seed: int = 0) -> tuple:
+    """
+    Predictions drawn from a small ID range so repeats are common, with -1
+    padding at the tail and at random positions, and some queries with no
+    relevant items
+    """
+    rng = np.random.default_rng(seed)
+    predicted = rng.integers(0, NUM_ITEMS, size=(num_queries, k))
+    predicted[rng.random((num_queries, k)) < 0.1] = -1
+    for q in range(0, num_queries, 7):
+        predicted[q, rng.integers(0, k):] = -1
+    relevant = [
+        rng.choice(NUM_ITEMS, size=rng.integers(0, 6), replace=False).tolist()
+        for _ in range(num_queries)
+    ]
+    return predicted, relevant
+
+
+@pytest.mark.parametrize("k", [1, 5, 10])
+def test_compute_metrics_matches_evaluator_helpers(k):
+    predicted, relevant = random_cases(200, k, seed=k)
+    relevance = ranking_metrics.build_relevance_matrix(relevant, NUM_ITEMS)
+    per_query = ranking_metrics.compute_metrics(predicted, relevance)
+
+    expected_recall = [
+        Evaluator.compute_recall_at_k(row.tolist(), true_ids, k) for row, true_ids in zip(predicted, relevant)
+    ]
+    expected_ap = [
+        Evaluator.compute_average_precision_at_k(row.tolist(), true_ids, k)
+        for row, true_ids in zip(predicted, relevant)
+    ]
+    np.testing.assert_allclose(per_query["recall"], expected_recall, atol=1e-9)
+    np.testing.assert_allclose(per_query["average_precision"], expected_ap, atol=1e-9)
+
+
+def test_repeated_ids_count_once():
+    relevance = ranking_metrics.build_relevance_matrix([[3, 5]], NUM_ITEMS)
+    per_query = ranking_metrics.compute_metrics(np.array([[3, 3, 5, -1]]), relevance)
+
+    assert per_query["num_retrieved"][0] == 2
+    assert per_query["recall"][0] == pytest.approx(1.0)
+    assert per_query["average_precision"][0] == pytest.approx((1 / 1 + 2 / 3) / 2)
+    assert per_query["reciprocal_rank"][0] == pytest.approx(1.0)
+
+
+def test_padding_before_item_zero_is_not_a_repeat():
+    relevance = ranking_metrics.build_relevance_matrix([[0]], NUM_ITEMS)
+    per_query = ranking_metrics.compute_metrics(np.array([[-1, 0, 3], [0, -1, 3]]), relevance[[0, 0]])
+
+    np.testing.assert_allclose(per_query["recall"], [1.0, 1.0])
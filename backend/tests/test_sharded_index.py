@@ -0,0 +1,34 @@
+"""
+Checks that scatter-gather search over shards matches a flat search
+
+Run from the backend directory:
+  pytest tests/test_sharded_index.py
+"""
+
+import faiss
+import numpy as np
+import pytest
+
+from tests.synthetic import make_vectors
+from utils.sharded_index import ShardedIndex
+
+
+@pytest.mark.parametrize("num_vectors,num_shards,k", [(1_000, 4, 10), (30, 4, 10), (5, 3, 10)])
+def test_sharded_search_matches_flat(num_vectors, num_shards, k):
+    vectors = make_vectors(num_vectors)
+    queries = make_vectors(16, seed=42)
+
+    flat = faiss.IndexFlatIP(vectors.shape[1])
+    flat.add(vectors)
+    expected_distances, expected_ids = flat.search(queries, k)
+
+    partition = np.random.default_rng(0).integers(0, num_shards, size=num_vectors)
+    sharded = ShardedIndex.from_vectors(vectors, partition)
+    try:
+        distances, ids = sharded.search(queries, k)
+    finally:
+        sharded.close()
+
+    np.testing.assert_array_equal(ids, expected_ids)
+    found = expected_ids >= 0
+    np.testing.assert_allclose(distances[found], expected_distances[found], rtol=1e-5)
@@ -0,0 +1,58 @@
+"""
+Checks for vectorstore bundle publishing and load-time validation
+
+Run from the backend directory:
+  pytest tests/test_vectorstore.py
+"""
+
+import os
+
+import pytest
+
+from utils import vectorstore
+from utils.preprocess import DataPreprocessor
+
+
+@pytest.fixture
+def built_workspace(synthetic_workspace):
+    """Synthetic workspace with one published bundle"""
+    workspace = synthetic_workspace(50, num_queries=5)
+    preprocessor = DataPreprocessor(
+        embedding_model=workspace["embedding_model"],
+        data_dir=workspace["data_dir"],
+        vectorstore_dir=workspace["vectorstore_dir"],
+    )
+    preprocessor.build_index()
+    workspace["preprocessor"] = preprocessor
+    return workspace
+
+
+def test_repeated_builds_publish_distinct_bundles(built_workspace):
+    vectorstore_dir = built_workspace["vectorstore_dir"]
+    first = vectorstore.load_bundle(vectorstore_dir).version
+    built_workspace["preprocessor"].build_index()
+    second = vectorstore.load_bundle(vectorstore_dir).version
+
+    assert first != second
+    bundles_dir = os.path.join(vectorstore_dir, vectorstore.BUNDLES_DIR)
+    assert {first, second} <= set(os.listdir(bundles_dir))
+    assert not [name for name in os.listdir(bundles_dir) if name.startswith(".tmp-")]
+
+
+def test_size_mismatch_raises(built_workspace):
+    vectorstore_dir = built_workspace["vectorstore_dir"]
+    bundle_dir = vectorstore.current_bundle_dir(vectorstore_dir)
+    with open(os.path.join(bundle_dir, vectorstore.DATA_FILE), 'ab') as f:
+        f.write(b"\0")
+
+    with pytest.raises(vectorstore.BundleError, match="size"):
+        vectorstore.load_bundle(vectorstore_dir)
+
+
+def test_model_mismatch_raises(built_workspace):
+    vectorstore_dir = built_workspace["vectorstore_dir"]
+    model_name = built_workspace["embedding_model"].model_name
+
+    assert vectorstore.load_bundle(vectorstore_dir, expected_model=model_name) is not None
+    with pytest.raises(vectorstore.BundleError, match="built with"):
+        vectorstore.load_bundle(vectorstore_dir, expected_model="some-other-model")
@@ -7,39 +7,73 @@ import numpy as np
 import os
 import sys
 import faiss
-import pickle
 
 # Add parent directory to path
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from models.embedding_model import EmbeddingModel
 from utils.preprocess import DataPreprocessor
+from utils import vectorstore
+from utils.late_fusion import LateFusionScorer
+from utils import ranking_metrics
+
+# Fallback load-test queries when no labeled data is available
+DEFAULT_QUERIES = [
+    "Hiring for a Python developer with strong communication skills",
+    "Need a data analyst who can work with SQL and Excel",
+    "Looking for a software engineer with problem-solving abilities",
+]
+
+def load_query_corpus(data_dir: str) -> list:
+    """Load unique queries from labeled_train.csv, falling back to built-in samples"""
+    train_path = os.path.join(data_dir, "labeled_train.csv")
+    if os.path.exists(train_path):
+        df = pd.read_csv(train_path)
+        queries = [q.strip() for q in df.get('Query', pd.Series(dtype=str)).dropna().astype(str)]
+        queries = list(dict.fromkeys(q for q in queries if q))
+        if queries:
+            return queries
+    print(f"Warning: no queries found in {train_path}. Using built-in samples.")
+    return DEFAULT_QUERIES
 
 class Evaluator:
     """Evaluates recommendation system using Recall@10 metric"""
     
-    def __init__(self):
-        self.embedding_model = EmbeddingModel()
-        self.data_dir = os.path.join(os.path.dirname(os.path.dirname(__file__)), "data")
-        self.vectorstore_dir = os.path.join(os.path.dirname(os.path.dirname(__file__)), "vectorstore")
+    def __init__(self, embedding_model=None, data_dir: str = None, vectorstore_dir: str = None,
+                 docs_dir: str = None):
+        """
+        Args:
+            embedding_model: Encoder exposing encode/encode_batch (defaults to EmbeddingModel)
+            data_dir: Directory holding labeled/unlabeled CSVs (defaults to backend/data)
+            vectorstore_dir: Directory holding the index (defaults to backend/vectorstore)
+            docs_dir: Directory results and submission CSVs are written to (defaults to docs/)
+        """
+        self.embedding_model = embedding_model if embedding_model is not None else EmbeddingModel()
+        self.data_dir = data_dir or os.path.join(os.path.dirname(os.path.dirname(__file__)), "data")
+        self.vectorstore_dir = vectorstore_dir or os.path.join(os.path.dirname(os.path.dirname(__file__)), "vectorstore")
+        self.bundle = None
+        self.docs_dir = docs_dir or os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), "docs")
     
     def load_index_and_data(self):
-        """Load FAISS index and assessment data"""
-        index_path = os.path.join(self.vectorstore_dir, "faiss_index.bin")
-        data_path = os.path.join(self.vectorstore_dir, "assessment_data.pkl")
+        """Load FAISS index and assessment data from the active vectorstore bundle"""
+        model_name = getattr(self.embedding_model, 'model_name', None)
+        bundle = vectorstore.load_bundle(self.vectorstore_dir, expected_model=model_name)
         
-        if not os.path.exists(index_path) or not os.path.exists(data_path):
+        if bundle is None:
             print("Index not found. Building index...")
-            preprocessor = DataPreprocessor()
+            preprocessor = DataPreprocessor(
+                embedding_model=self.embedding_model,
+                data_dir=self.data_dir,
+                vectorstore_dir=self.vectorstore_dir
+            )
             preprocessor.build_index()
+            bundle = vectorstore.load_bundle(self.vectorstore_dir, expected_model=model_name)
         
-        index = faiss.read_index(index_path)
-        with open(data_path, 'rb') as f:
-            assessment_data = pickle.load(f)
-        
-        return index, assessment_data
+        self.bundle = bundle
+        return bundle.index, bundle.assessment_data
     
-    def compute_recall_at_k(self, predicted_urls: list, true_urls: list, k: int = 10) -> float:
+    @staticmethod
+    def compute_recall_at_k(predicted_urls: list, true_urls: list, k: int = 10) -> float:
         """
         Compute Recall@K
         
@@ -65,21 +99,18 @@ class Evaluator:
         
         return recall
     
-    def evaluate(self, k: int = 10) -> dict:
+    def load_labeled_queries(self) -> dict:
         """
-        Evaluate the recommendation system on labeled test data
+        Load labeled queries grouped by query text
         
         Returns:
-            Dictionary with evaluation metrics
+            Dictionary mapping query -> list of relevant URLs (empty if no labeled data)
         """
-        print("Starting evaluation...")
-        
-        # Load labeled training data
         train_path = os.path.join(self.data_dir, "labeled_train.csv")
         
         if not os.path.exists(train_path):
             print(f"Warning: {train_path} not found. Skipping evaluation.")
-            return {"mean_recall_at_10": 0.0, "total_queries": 0}
+            return {}
         
         train_df = pd.read_csv(train_path)
         
@@ -94,65 +125,244 @@ class Evaluator:
                     query_to_urls[query] = []
                 query_to_urls[query].append(url)
         
+        return query_to_urls
+    
+    def load_field_scorer(self) -> LateFusionScorer:
+        """Load the late-fusion scorer from the current bundle (None if not built)"""
+        if self.bundle is None:
+            self.load_index_and_data()
+        return LateFusionScorer.from_arrays(self.bundle.load_arrays("field_embeddings.npz"))
+    
+    @staticmethod
+    def compute_average_precision_at_k(predicted_urls: list, true_urls: list, k: int = 10) -> float:
+        """
+        Compute Average Precision@K (the per-query term of MAP@K)
+        
+        Args:
+            predicted_urls: List of predicted assessment URLs
+            true_urls: List of true/relevant assessment URLs
+            k: Number of top predictions to consider
+            
+        Returns:
+            AP@K score (0.0 to 1.0)
+        """
+        if len(true_urls) == 0:
+            return 0.0
+        
+        relevant = set(true_urls)
+        found = set()
+        hits = 0
+        precision_sum = 0.0
+        for rank, url in enumerate(predicted_urls[:k], start=1):
+            if url in relevant and url not in found:
+                found.add(url)
+                hits += 1
+                precision_sum += hits / rank
+        
+        return precision_sum / min(len(relevant), k)
+    
+    def retrieve_batch(self, queries: list, k: int = 10, field_weights: dict = None) -> np.ndarray:
+        """
+        Retrieve the top-k catalog rows for many queries with one encode and one search
+        
+        Args:
+            queries: Query strings
+            k: Results per query
+            field_weights: Score with late fusion instead of the FAISS index
+            
+        The bundle loaded by the last load_index_and_data call is reused (it is
+        loaded on first use), so repeated batches search one consistent index
+        without re-reading it from disk.
+        
+        Returns:
+            int64 array (num_queries x k) of catalog row IDs, padded with -1
+        """
+        if self.bundle is None:
+            self.load_index_and_data()
+        index = self.bundle.index
+        
+        field_scorer = None
+        if field_weights is not None:
+            field_scorer = self.load_field_scorer()
+            if field_scorer is None:
+                raise ValueError("Index was built without field embeddings; rebuild to use field weights")
+        
+        query_embeddings = np.ascontiguousarray(self.embedding_model.encode(queries), dtype='float32')
+        faiss.normalize_L2(query_embeddings)
+        
+        search_k = min(k, index.ntotal)
+        if field_scorer is not None:
+            distances, indices = field_scorer.search(query_embeddings, search_k, field_weights)
+        else:
+            distances, indices = index.search(query_embeddings, search_k)
+        
+        predicted = np.full((len(queries), k), -1, dtype=np.int64)
+        predicted[:, :search_k] = indices
+        return predicted
+    
+    @staticmethod
+    def build_url_ids(assessment_data: list, true_urls: list) -> tuple:
+        """
+        Map catalog rows and labeled URLs into one integer URL-ID space
+        
+        Both sides are compared by canonical URL, so a label written as a URL
+        variant merged away at build time still matches its catalog row.
+        Labeled URLs missing from the catalog get their own IDs so they still
+        count as relevant-but-unretrievable; catalog rows without a URL get
+        one ID each.
+        
+        Args:
+            assessment_data: Catalog rows
+            true_urls: For each query, its list of relevant URLs
+            
+        Returns:
+            Tuple of (row_to_url_id int64 array, relevance CSR matrix, URL key list)
+        """
+        url_to_id = {}
+        row_to_url_id = np.array([
+            url_to_id.setdefault(DataPreprocessor.url_key(assessment['url'], row), len(url_to_id))
+            for row, assessment in enumerate(assessment_data)
+        ], dtype=np.int64)
+        
+        relevant_ids = []
+        for urls in true_urls:
+            relevant_ids.append([
+                url_to_id.setdefault(DataPreprocessor.canonicalize_url(url), len(url_to_id)) for url in urls
+            ])
+        
+        relevance = ranking_metrics.build_relevance_matrix(relevant_ids, len(url_to_id))
+        return row_to_url_id, relevance, list(url_to_id)
+    
+    @staticmethod
+    def rows_to_url_ids(predicted_rows: np.ndarray, row_to_url_id: np.ndarray) -> np.ndarray:
+        """Translate predicted catalog row IDs to URL IDs, keeping -1 padding"""
+        return np.where(predicted_rows >= 0, row_to_url_id[np.maximum(predicted_rows, 0)], -1)
+    
+    def evaluate(self, k: int = 10, field_weights: dict = None, save_results: bool = True,
+                 bootstrap_samples: int = 1000) -> dict:
+        """
+        Evaluate the recommendation system on labeled test data
+        
+        All queries are encoded and searched in one batch and every metric is
+        computed in one vectorized pass by utils.ranking_metrics.
+        
+        Args:
+            k: Number of top predictions to consider
+            field_weights: Score with late fusion using these per-field weights
+                instead of the concatenated-text FAISS index
+            save_results: Write per-query results to docs/results.csv
+            bootstrap_samples: Bootstrap resamples for the confidence intervals
+        
+        Returns:
+            Dictionary with evaluation metrics
+        """
+        print("Starting evaluation...")
+        
+        query_to_urls = self.load_labeled_queries()
+        
         if len(query_to_urls) == 0:
             print("No labeled queries found. Skipping evaluation.")
             return {"mean_recall_at_10": 0.0, "total_queries": 0}
         
-        # Load index and data
-        index, assessment_data = self.load_index_and_data()
+        queries = list(query_to_urls.keys())
+        self.load_index_and_data()
+        predicted_rows = self.retrieve_batch(queries, k, field_weights)
         
-        # Evaluate each query
-        recalls = []
-        results = []
+        row_to_url_id, relevance, _ = self.build_url_ids(
+            self.bundle.assessment_data, [query_to_urls[query] for query in queries]
+        )
+        predicted = self.rows_to_url_ids(predicted_rows, row_to_url_id)
+        per_query = ranking_metrics.compute_metrics(predicted, relevance)
+        summary = ranking_metrics.summarize_metrics(per_query, num_samples=bootstrap_samples)
         
-        for query, true_urls in query_to_urls.items():
-            # Generate recommendations
-            query_embedding = self.embedding_model.encode([query])
-            query_embedding = np.array(query_embedding, dtype='float32')
-            faiss.normalize_L2(query_embedding)
-            
-            # Search in index
-            search_k = min(k, index.ntotal)
-            distances, indices = index.search(query_embedding, search_k)
-            
-            # Get predicted URLs
-            predicted_urls = []
-            for idx in indices[0]:
-                if idx < len(assessment_data):
-                    predicted_urls.append(assessment_data[idx]['url'])
-            
-            # Compute recall
-            recall = self.compute_recall_at_k(predicted_urls, true_urls, k)
-            recalls.append(recall)
-            
+        results = []
+        for i, query in enumerate(queries):
             results.append({
                 'query': query,
-                'recall_at_10': recall,
-                'num_relevant': len(true_urls),
-                'num_retrieved': len(set(predicted_urls) & set(true_urls))
+                'recall_at_10': float(per_query['recall'][i]),
+                'num_relevant': int(per_query['num_relevant'][i]),
+                'num_retrieved': int(per_query['num_retrieved'][i]),
+                'precision_at_k': float(per_query['precision'][i]),
+                'average_precision_at_k': float(per_query['average_precision'][i]),
+                'ndcg_at_k': float(per_query['ndcg'][i]),
+                'reciprocal_rank': float(per_query['reciprocal_rank'][i])
             })
         
-        # Compute mean recall
-        mean_recall = np.mean(recalls) if len(recalls) > 0 else 0.0
-        
-        # Save results
-        results_df = pd.DataFrame(results)
-        results_path = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), "docs", "results.csv")
-        os.makedirs(os.path.dirname(results_path), exist_ok=True)
-        results_df.to_csv(results_path, index=False)
+        recalls = per_query['recall'].tolist()
+        mean_recall = summary['recall']['mean']
         
         print(f"\nEvaluation Results:")
-        print(f"Mean Recall@{k}: {mean_recall:.4f}")
+        labels = {
+            "recall": f"Recall@{k}",
+            "precision": f"Precision@{k}",
+            "average_precision": f"MAP@{k}",
+            "ndcg": f"nDCG@{k}",
+            "reciprocal_rank": "MRR",
+        }
+        for name, label in labels.items():
+            stats = summary[name]
+            print(f"Mean {label}: {stats['mean']:.4f} (95% CI {stats['ci_low']:.4f}-{stats['ci_high']:.4f})")
         print(f"Total Queries: {len(recalls)}")
-        print(f"Results saved to {results_path}")
+        
+        # Save results
+        if save_results:
+            results_df = pd.DataFrame(results)
+            results_path = os.path.join(self.docs_dir, "results.csv")
+            os.makedirs(os.path.dirname(results_path), exist_ok=True)
+            results_df.to_csv(results_path, index=False)
+            print(f"Results saved to {results_path}")
         
         return {
             "mean_recall_at_10": mean_recall,
             "total_queries": len(recalls),
             "individual_recalls": recalls,
+            "metrics": summary,
             "results": results
         }
     
+    def tune_field_weights(self, candidates: list, k: int = 10) -> dict:
+        """
+        Pick late-fusion weights by Recall@K on the labeled queries
+        
+        Queries are encoded once; each candidate only costs one fused scoring pass.
+        
+        Args:
+            candidates: List of {field: weight} dictionaries to try
+            k: Number of top predictions to consider
+            
+        Returns:
+            Dictionary with the best weights, its recall and all trial scores
+        """
+        query_to_urls = self.load_labeled_queries()
+        if len(query_to_urls) == 0 or len(candidates) == 0:
+            return {"best_weights": None, "best_recall": 0.0, "trials": []}
+        
+        index, assessment_data = self.load_index_and_data()
+        field_scorer = self.load_field_scorer()
+        if field_scorer is None:
+            raise ValueError("Index was built without field embeddings; rebuild to tune field weights")
+        
+        queries = list(query_to_urls.keys())
+        query_embeddings = np.ascontiguousarray(self.embedding_model.encode(queries), dtype='float32')
+        faiss.normalize_L2(query_embeddings)
+        row_to_url_id, relevance, _ = self.build_url_ids(
+            assessment_data, [query_to_urls[query] for query in queries]
+        )
+        
+        trials = []
+        for weights in candidates:
+            distances, indices = field_scorer.search(query_embeddings, k, weights)
+            per_query = ranking_metrics.compute_metrics(self.rows_to_url_ids(indices, row_to_url_id), relevance)
+            trials.append({
+                "weights": weights,
+                "mean_recall": float(per_query['recall'].mean()),
+                "map": float(per_query['average_precision'].mean())
+            })
+            print(f"Weights {weights}: Mean Recall@{k} = {trials[-1]['mean_recall']:.4f}, MAP@{k} = {trials[-1]['map']:.4f}")
+        
+        best = max(trials, key=lambda trial: trial["mean_recall"])
+        return {"best_weights": best["weights"], "best_recall": best["mean_recall"], "trials": trials}
+    
     def generate_submission_csv(self):
         """Generate submission CSV for unlabeled test queries"""
         print("Generating submission CSV...")
@@ -203,7 +413,7 @@ class Evaluator:
         
         # Save submission CSV
         submission_df = pd.DataFrame(submission_data)
-        submission_path = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), "docs", "submission.csv")
+        submission_path = os.path.join(self.docs_dir, "submission.csv")
         os.makedirs(os.path.dirname(submission_path), exist_ok=True)
         submission_df.to_csv(submission_path, index=False)
         
@@ -0,0 +1,142 @@
+"""
+Prometheus metrics for the recommendation API
+
+All collectors are module-level singletons and the per-stage histogram
+children are bound once at import time, so recording a sample on the
+request path is a lock-protected float update with no label lookups.
+"""
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    Counter,
+    Gauge,
+    Histogram,
+    Info,
+    generate_latest,
+)
+
+# Latency buckets in seconds, tuned for sub-millisecond search up to slow model loads
+LATENCY_BUCKETS = (
+    0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+    0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0,
+)
+
+REQUEST_COUNT = Counter(
+    "shl_requests_total",
+    "Total API requests",
+    ["endpoint", "status"],
+)
+
+REQUEST_ERRORS = Counter(
+    "shl_request_errors_total",
+    "Total API requests that failed",
+    ["endpoint"],
+)
+
+REQUEST_LATENCY = Histogram(
+    "shl_request_latency_seconds",
+    "End-to-end request latency",
+    ["endpoint"],
+    buckets=LATENCY_BUCKETS,
+)
+
+STAGE_LATENCY = Histogram(
+    "shl_stage_latency_seconds",
+    "Latency of individual recommendation stages",
+    ["stage"],
+    buckets=LATENCY_BUCKETS,
+)
+
+IN_FLIGHT = Gauge(
+    "shl_requests_in_flight",
+    "Requests currently being processed",
+    ["endpoint"],
+)
+
+INDEX_SIZE = Gauge(
+    "shl_index_size",
+    "Number of vectors in the loaded FAISS index (ntotal)",
+)
+
+INDEX_INFO = Info(
+    "shl_index",
+    "Version and build details of the loaded vectorstore bundle",
+)
+
+THREAD_CONFIG = Info(
+    "shl_thread_config",
+    "torch/FAISS thread counts applied at startup and the tuned worker count",
+)
+
+CACHE_LOOKUPS = Counter(
+    "shl_cache_lookups_total",
+    "Cache lookups by cache name and result",
+    ["cache", "result"],
+)
+
+CACHE_HIT_RATIO = Gauge(
+    "shl_cache_hit_ratio",
+    "Fraction of cache lookups that were hits since process start",
+    ["cache"],
+)
+
+SEMANTIC_CACHE_SIMILARITY = Histogram(
+    "shl_semantic_cache_similarity",
+    "Cosine similarity of the nearest cached query on semantic cache lookups",
+    buckets=(0.5, 0.7, 0.8, 0.85, 0.9, 0.93, 0.95, 0.97, 0.98, 0.99, 1.0),
+)
+
+SEMANTIC_CACHE_DRIFT = Histogram(
+    "shl_semantic_cache_drift",
+    "Fraction of a fresh search's results missing from the cached ranking (sampled on hits)",
+    buckets=(0.0, 0.1, 0.2, 0.3, 0.4, 0.5, 0.6, 0.8, 1.0),
+)
+
+# Pre-bound stage children for the /recommend hot path
+STAGE_MODEL_LOAD = STAGE_LATENCY.labels(stage="model_load")
+STAGE_ENCODE = STAGE_LATENCY.labels(stage="encode")
+STAGE_SEARCH = STAGE_LATENCY.labels(stage="search")
+STAGE_RESPONSE = STAGE_LATENCY.labels(stage="response")
+
+
+class CacheStats:
+    """Hit/miss counters for one named cache, with a derived hit-ratio gauge"""
+
+    def __init__(self, name: str):
+        """
+        Register counters for a cache
+
+        Args:
+            name: Cache name used as the ``cache`` label
+        """
+        self.name = name
+        self.hits = 0
+        self.misses = 0
+        self._hit_counter = CACHE_LOOKUPS.labels(cache=name, result="hit")
+        self._miss_counter = CACHE_LOOKUPS.labels(cache=name, result="miss")
+        CACHE_HIT_RATIO.labels(cache=name).set_function(self.hit_ratio)
+
+    def hit(self):
+        """Record a cache hit"""
+        self.hits += 1
+        self._hit_counter.inc()
+
+    def miss(self):
+        """Record a cache miss"""
+        self.misses += 1
+        self._miss_counter.inc()
+
+    def hit_ratio(self) -> float:
+        """Return hits / lookups, or 0.0 before the first lookup"""
+        total = self.hits + self.misses
+        return self.hits / total if total > 0 else 0.0
+
+
+def render_metrics() -> tuple:
+    """
+    Render all registered metrics in the Prometheus text format
+
+    Returns:
+        Tuple of (payload bytes, content type)
+    """
+    return generate_latest(), CONTENT_TYPE_LATEST
@@ -0,0 +1,157 @@
+"""
+Offline precomputed recommendations for known queries
+
+A build-time job retrieves rankings for a list of known queries in one
+batch through Evaluator.retrieve_batch and writes a compact lookup table:
+64-bit hashes of the normalized query text mapped to int32 catalog IDs.
+The API checks the table before encoding, so known queries skip the model
+entirely. The table records the vectorstore bundle version it was built
+against and is ignored once the index is rebuilt.
+
+Usage:
+  python -m utils.precompute                               # data/unlabeled_test.csv
+  python -m utils.precompute exports/queries.csv --column Query
+"""
+
+import argparse
+import hashlib
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+# Add parent directory to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.evaluator import Evaluator
+from utils.preprocess import DataPreprocessor
+from utils.query_cache import normalize_query
+
+TABLE_NAME = "precomputed.npz"
+TOP_K = 10
+
+
+def query_key(query: str) -> int:
+    """64-bit hash of the normalized query"""
+    digest = hashlib.blake2b(normalize_query(query).encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "little")
+
+
+def _unique_rows(row_ids: np.ndarray, assessment_data: list, k: int) -> list:
+    """Keep the first k rows with distinct canonical URLs, as /recommend does"""
+    seen = set()
+    ranking = []
+    for idx in row_ids.tolist():
+        if 0 <= idx < len(assessment_data):
+            key = DataPreprocessor.url_key(assessment_data[idx]['url'], idx)
+            if key not in seen:
+                seen.add(key)
+                ranking.append(idx)
+                if len(ranking) >= k:
+                    break
+    return ranking
+
+
+def build_precomputed_table(queries: list, evaluator: Evaluator = None, k: int = TOP_K,
+                            batch_size: int = 1024) -> str:
+    """
+    Retrieve rankings for known queries and write the lookup table
+
+    Args:
+        queries: Query strings (duplicates after normalization are dropped)
+        evaluator: Evaluator providing the encoder and the vectorstore bundle
+        k: Rankings stored per query
+        batch_size: Queries encoded and searched per batch
+
+    Returns:
+        Path of the written table
+    """
+    evaluator = evaluator or Evaluator()
+    # Load once: every batch searches this bundle and the table is stamped with its version
+    evaluator.load_index_and_data()
+    bundle = evaluator.bundle
+    assessment_data = bundle.assessment_data
+
+    unique_queries = {}
+    for query in queries:
+        query = str(query).strip()
+        if query and query != 'nan':
+            unique_queries.setdefault(query_key(query), query)
+    keys = np.array(sorted(unique_queries), dtype=np.uint64)
+    texts = [unique_queries[int(key)] for key in keys]
+    print(f"Precomputing rankings for {len(texts)} unique queries...")
+
+    ids = np.full((len(texts), k), -1, dtype=np.int32)
+    for start in range(0, len(texts), batch_size):
+        batch = texts[start:start + batch_size]
+        predicted = evaluator.retrieve_batch(batch, k)
+        for offset, row in enumerate(predicted):
+            ranking = _unique_rows(row, assessment_data, k)
+            ids[start + offset, :len(ranking)] = ranking
+
+    path = os.path.join(evaluator.vectorstore_dir, TABLE_NAME)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, 'wb') as f:
+        np.savez(f, keys=keys, ids=ids, index_version=np.array(bundle.version))
+    os.replace(tmp_path, path)
+
+    print(f"Precomputed table for bundle {bundle.version} saved to {path}")
+    return path
+
+
+class PrecomputedTable:
+    """In-memory key -> ranking lookup loaded from the precomputed table"""
+
+    def __init__(self, keys: np.ndarray, ids: np.ndarray):
+        self._rows = {int(key): row for row, key in enumerate(keys.tolist())}
+        self._rankings = [[int(idx) for idx in row if idx >= 0] for row in ids]
+
+    def __len__(self):
+        return len(self._rows)
+
+    @classmethod
+    def load(cls, vectorstore_dir: str, index_version: str):
+        """
+        Load the table if it was built against the given bundle version
+
+        Returns:
+            PrecomputedTable, or None if absent or stale
+        """
+        path = os.path.join(vectorstore_dir, TABLE_NAME)
+        if not os.path.exists(path):
+            return None
+        with np.load(path) as table:
+            table_version = str(table['index_version'])
+            if table_version != index_version:
+                print(f"Warning: ignoring precomputed table built for bundle {table_version} "
+                      f"(current bundle is {index_version}). Re-run utils.precompute.")
+                return None
+            return cls(table['keys'], table['ids'])
+
+    def get(self, query: str):
+        """Ranking for a known query, or None"""
+        row = self._rows.get(query_key(query))
+        return self._rankings[row] if row is not None else None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Precompute recommendations for known queries")
+    parser.add_argument("csv_paths", nargs="*", help="CSV files with queries (default: data/unlabeled_test.csv)")
+    parser.add_argument("--column", default="Query", help="Column holding the query text")
+    parser.add_argument("--k", type=int, default=TOP_K, help="Recommendations stored per query")
+    args = parser.parse_args()
+
+    evaluator = Evaluator()
+    csv_paths = args.csv_paths or [os.path.join(evaluator.data_dir, "unlabeled_test.csv")]
+
+    queries = []
+    for csv_path in csv_paths:
+        df = pd.read_csv(csv_path)
+        queries.extend(df[args.column].astype(str).tolist())
+
+    build_precomputed_table(queries, evaluator=evaluator, k=args.k)
+
+
+if __name__ == "__main__":
+    main()
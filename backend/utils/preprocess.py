@@ -7,17 +7,44 @@ import numpy as np
 import faiss
 import os
 import pickle
+import hashlib
 from typing import List, Dict
+from urllib.parse import urlsplit, urlunsplit
 from models.embedding_model import EmbeddingModel
 from utils.crawler import SHLCatalogCrawler
+from utils.vectorstore import BundleWriter
+from utils.late_fusion import FIELDS
 
 class DataPreprocessor:
     """Handles data preprocessing and FAISS index creation"""
     
-    def __init__(self):
-        self.embedding_model = EmbeddingModel()
-        self.data_dir = os.path.join(os.path.dirname(os.path.dirname(__file__)), "data")
-        self.vectorstore_dir = os.path.join(os.path.dirname(os.path.dirname(__file__)), "vectorstore")
+    # Number of precomputed "similar assessment" neighbors stored per catalog item
+    NEIGHBOR_K = 20
+    
+    # How duplicate-URL rows are merged into one vector: "max" (max-pool, renormalized) or "first"
+    URL_GROUP_POOLING = "max"
+    
+    # Text templates for the concatenated embedding text. {type_suffix} is
+    # " Type: <label>" when the assessment has a type, else empty.
+    TEXT_TEMPLATES = {
+        "default": "{name}. {description}{type_suffix}",
+        "name_description": "{name}. {description}",
+        "description_type": "{description}{type_suffix}",
+        "name_type": "{name}.{type_suffix}",
+    }
+    # Recorded in the bundle manifest so indexes built from different templates are distinguishable
+    TEXT_TEMPLATE = TEXT_TEMPLATES["default"]
+    
+    def __init__(self, embedding_model=None, data_dir: str = None, vectorstore_dir: str = None):
+        """
+        Args:
+            embedding_model: Encoder exposing encode/encode_batch (defaults to EmbeddingModel)
+            data_dir: Directory holding catalog and dataset files (defaults to backend/data)
+            vectorstore_dir: Directory the index is written to (defaults to backend/vectorstore)
+        """
+        self.embedding_model = embedding_model if embedding_model is not None else EmbeddingModel()
+        self.data_dir = data_dir or os.path.join(os.path.dirname(os.path.dirname(__file__)), "data")
+        self.vectorstore_dir = vectorstore_dir or os.path.join(os.path.dirname(os.path.dirname(__file__)), "vectorstore")
         
         # Create directories if they don't exist
         os.makedirs(self.data_dir, exist_ok=True)
@@ -114,8 +141,16 @@ class DataPreprocessor:
         
         return train_df, test_df
     
-    def prepare_assessment_texts(self, df: pd.DataFrame) -> List[str]:
-        """Prepare text for embedding from assessment DataFrame"""
+    def prepare_assessment_texts(self, df: pd.DataFrame, template: str = None) -> List[str]:
+        """
+        Prepare text for embedding from assessment DataFrame
+        
+        Args:
+            df: Catalog DataFrame
+            template: Format string using {name}, {description} and {type_suffix}
+                (defaults to TEXT_TEMPLATE)
+        """
+        template = template or self.TEXT_TEMPLATE
         texts = []
         
         for _, row in df.iterrows():
@@ -125,15 +160,148 @@ class DataPreprocessor:
             assessment_type = str(row.get('type', ''))
             
             # Create a comprehensive text representation
-            text = f"{name}. {description}"
-            if assessment_type:
-                type_label = "Technical/Knowledge Assessment" if assessment_type == 'K' else "Personality/Behavioral Assessment"
-                text += f" Type: {type_label}"
+            type_suffix = f" Type: {self._type_label(assessment_type)}" if assessment_type else ""
+            text = template.format(name=name, description=description, type_suffix=type_suffix)
             
             texts.append(text)
         
         return texts
     
+    @staticmethod
+    def _type_label(assessment_type: str) -> str:
+        """Human-readable label for an assessment type code"""
+        return "Technical/Knowledge Assessment" if assessment_type == 'K' else "Personality/Behavioral Assessment"
+    
+    def prepare_field_texts(self, df: pd.DataFrame) -> Dict[str, List[str]]:
+        """Prepare one text per field (name, description, type) for late-fusion embeddings"""
+        field_texts = {field: [] for field in FIELDS}
+        
+        for _, row in df.iterrows():
+            assessment_type = str(row.get('type', ''))
+            field_texts['name'].append(str(row.get('name', '')))
+            field_texts['description'].append(str(row.get('description', '')))
+            field_texts['type'].append(self._type_label(assessment_type) if assessment_type else '')
+        
+        return field_texts
+    
+    def build_field_embeddings(self, catalog_df: pd.DataFrame) -> np.ndarray:
+        """
+        Encode each field separately for late fusion
+        
+        Returns:
+            float32 array (num_fields x num_items x d), rows L2-normalized
+        """
+        field_texts = self.prepare_field_texts(catalog_df)
+        matrices = []
+        for field in FIELDS:
+            print(f"Generating {field} embeddings...")
+            matrix = np.ascontiguousarray(
+                self.embedding_model.encode_batch(field_texts[field], batch_size=32), dtype='float32'
+            )
+            faiss.normalize_L2(matrix)
+            matrices.append(matrix)
+        return np.stack(matrices)
+    
+    @staticmethod
+    def canonicalize_url(url: str) -> str:
+        """
+        Canonical form used to detect duplicate catalog URLs
+        
+        Lowercases scheme and host, drops the fragment and any trailing slash.
+        """
+        url = url.strip()
+        parts = urlsplit(url)
+        path = parts.path.rstrip('/') or '/'
+        return urlunsplit((parts.scheme.lower(), parts.netloc.lower(), path, parts.query, ''))
+    
+    @classmethod
+    def url_key(cls, url, position: int):
+        """
+        Dedup key of a catalog row: its canonical URL, or a key unique to the
+        row when it has no URL, so URL-less rows are never merged
+        """
+        url = str(url).strip() if url is not None else ''
+        if url and url != 'nan':
+            return cls.canonicalize_url(url)
+        return ('row', position)
+    
+    def group_by_url(self, catalog_df: pd.DataFrame) -> List[List[int]]:
+        """
+        Group catalog rows that share a canonical URL
+        
+        Rows without a URL are kept as their own groups.
+        
+        Returns:
+            List of row-index lists, ordered by first appearance
+        """
+        groups = {}
+        for position, url in enumerate(catalog_df.get('url', pd.Series([''] * len(catalog_df))).tolist()):
+            groups.setdefault(self.url_key(url, position), []).append(position)
+        return list(groups.values())
+    
+    def pool_groups(self, embeddings: np.ndarray, groups: List[List[int]], axis: int = 0) -> np.ndarray:
+        """
+        Merge the vectors of each URL group into one normalized vector
+        
+        Args:
+            embeddings: Normalized float32 vectors, rows along `axis`
+            groups: Row-index lists from group_by_url
+            axis: Axis holding catalog rows (1 for stacked field embeddings)
+            
+        Returns:
+            float32 array with one row per group along `axis`
+        """
+        if all(len(group) == 1 for group in groups):
+            return np.ascontiguousarray(np.take(embeddings, [g[0] for g in groups], axis=axis))
+        
+        if self.URL_GROUP_POOLING == "first":
+            pooled = np.take(embeddings, [g[0] for g in groups], axis=axis)
+        else:
+            order = [row for group in groups for row in group]
+            starts = np.cumsum([0] + [len(group) for group in groups[:-1]])
+            pooled = np.maximum.reduceat(np.take(embeddings, order, axis=axis), starts, axis=axis)
+        
+        norms = np.linalg.norm(pooled, axis=-1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return np.ascontiguousarray(pooled / norms, dtype='float32')
+    
+    def build_neighbor_table(self, index, embeddings: np.ndarray, k: int = None) -> tuple:
+        """
+        Compute the top-k catalog neighbors of every catalog item
+        
+        Uses one batched FAISS self-search over all embeddings. Each item's
+        own row is dropped from its neighbor list; rows with fewer than k
+        other items are padded with -1.
+        
+        Args:
+            index: FAISS index containing the catalog embeddings
+            embeddings: Normalized float32 catalog embeddings (n x d)
+            k: Neighbors per item (defaults to NEIGHBOR_K)
+            
+        Returns:
+            Tuple of (neighbor_ids int32 n x k, neighbor_scores float16 n x k)
+        """
+        k = k or self.NEIGHBOR_K
+        n = index.ntotal
+        search_k = min(k + 1, n)
+        scores, ids = index.search(embeddings, search_k)
+        
+        # Move each row's self-match (wherever it ranks) behind the real neighbors
+        not_self = ids != np.arange(n)[:, None]
+        order = np.argsort(~not_self, axis=1, kind='stable')
+        ids = np.take_along_axis(ids, order, axis=1)
+        scores = np.take_along_axis(scores, order, axis=1)
+        valid = np.take_along_axis(not_self, order, axis=1)
+        ids = np.where(valid, ids, -1)[:, :k]
+        scores = np.where(valid, scores, 0.0)[:, :k]
+        
+        neighbor_ids = np.full((n, k), -1, dtype=np.int32)
+        neighbor_scores = np.zeros((n, k), dtype=np.float16)
+        neighbor_ids[:, :ids.shape[1]] = ids
+        neighbor_scores[:, :scores.shape[1]] = scores
+        
+        return neighbor_ids, neighbor_scores
+    
     def build_index(self):
         """Build FAISS index from catalog data"""
         print("Building FAISS index...")
@@ -161,28 +329,76 @@ class DataPreprocessor:
         faiss.normalize_L2(embeddings)
         index = faiss.IndexFlatIP(dimension)  # Inner product for cosine similarity
         
+        # Collapse duplicate URLs so every index entry is a unique result
+        embeddings = embeddings.astype('float32')
+        url_groups = self.group_by_url(catalog_df)
+        embeddings = self.pool_groups(embeddings, url_groups)
+        print(f"Grouped {len(catalog_df)} catalog rows into {len(url_groups)} unique URLs")
+        
         # Add embeddings to index
-        index.add(embeddings.astype('float32'))
-        
-        # Save index
-        index_path = os.path.join(self.vectorstore_dir, "faiss_index.bin")
-        faiss.write_index(index, index_path)
-        print(f"FAISS index saved to {index_path}")
-        
-        # Save assessment data (for retrieving names and URLs)
-        assessment_data = []
-        for idx, row in catalog_df.iterrows():
-            assessment_data.append({
-                'name': str(row.get('name', '')),
-                'url': str(row.get('url', '')),
-                'description': str(row.get('description', '')),
-                'type': str(row.get('type', ''))
-            })
-        
-        data_path = os.path.join(self.vectorstore_dir, "assessment_data.pkl")
-        with open(data_path, 'wb') as f:
-            pickle.dump(assessment_data, f)
-        print(f"Assessment data saved to {data_path}")
+        index.add(embeddings)
+        
+        # Stage all artifacts; they become visible together when the bundle is committed
+        writer = BundleWriter(self.vectorstore_dir)
+        try:
+            faiss.write_index(index, writer.path("faiss_index.bin"))
+            
+            # Save assessment data (for retrieving names and URLs): one entry
+            # per URL group, taken from the group's first catalog row
+            assessment_data = []
+            for group in url_groups:
+                row = catalog_df.iloc[group[0]]
+                assessment_data.append({
+                    'name': str(row.get('name', '')),
+                    'url': str(row.get('url', '')),
+                    'description': str(row.get('description', '')),
+                    'type': str(row.get('type', ''))
+                })
+            
+            # Catalog row -> index ID, for tracing grouped duplicates back to the catalog
+            row_to_id = np.empty(len(catalog_df), dtype=np.int32)
+            for group_id, group in enumerate(url_groups):
+                row_to_id[group] = group_id
+            with open(writer.path("url_groups.npz"), 'wb') as f:
+                np.savez(f, row_to_id=row_to_id)
+            
+            with open(writer.path("assessment_data.pkl"), 'wb') as f:
+                pickle.dump(assessment_data, f)
+            
+            # Precompute "similar assessments" so lookups never re-encode
+            neighbor_ids, neighbor_scores = self.build_neighbor_table(index, embeddings)
+            with open(writer.path("neighbors.npz"), 'wb') as f:
+                np.savez(f, ids=neighbor_ids, scores=neighbor_scores)
+            
+            # Per-field embeddings so fusion weights are a query-time parameter
+            field_embeddings = self.pool_groups(self.build_field_embeddings(catalog_df), url_groups, axis=1)
+            with open(writer.path("field_embeddings.npz"), 'wb') as f:
+                np.savez(f, fields=np.array(FIELDS), embeddings=field_embeddings)
+        except Exception:
+            writer.abort()
+            raise
+        
+        catalog_hash = hashlib.sha256(
+            pd.util.hash_pandas_object(catalog_df.astype(str), index=False).values.tobytes()
+        ).hexdigest()
+        version = writer.commit(
+            model_name=getattr(self.embedding_model, 'model_name', type(self.embedding_model).__name__),
+            dimension=dimension,
+            count=index.ntotal,
+            build_params={
+                "index_type": type(index).__name__,
+                "metric": "inner_product",
+                "normalized": True,
+                "text_template": self.TEXT_TEMPLATE,
+                "neighbor_k": self.NEIGHBOR_K,
+                "fields": list(FIELDS),
+                "catalog_sha256": catalog_hash,
+                "catalog_rows": len(catalog_df),
+                "url_groups": True,
+                "url_group_pooling": self.URL_GROUP_POOLING,
+            }
+        )
+        print(f"Vectorstore bundle {version} saved to {self.vectorstore_dir}")
         
         print(f"Index built successfully with {index.ntotal} assessments")
 
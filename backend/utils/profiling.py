@@ -0,0 +1,196 @@
+"""
+Opt-in request profiling for /recommend
+
+Profiling is off unless PROFILING_ENABLED is set. When enabled, a request is
+profiled if it sends ``X-Profile: 1`` (and the matching ``X-Admin-Token`` when
+PROFILING_ADMIN_TOKEN is configured), or if it is picked by random sampling at
+PROFILING_SAMPLE_RATE. Each profile is stored under PROFILE_DIR as a
+pyinstrument HTML flame graph (or a cProfile .pstats file when pyinstrument
+is not installed) next to a JSON file with timing and input-shape metadata.
+"""
+
+import cProfile
+import json
+import os
+import random
+import re
+import time
+import uuid
+
+try:
+    from pyinstrument import Profiler as _PyinstrumentProfiler
+except ImportError:
+    _PyinstrumentProfiler = None
+
+try:
+    import torch
+except ImportError:
+    torch = None
+
+PROFILING_ENABLED = os.getenv("PROFILING_ENABLED", "false").lower() in ("1", "true", "yes")
+PROFILING_ADMIN_TOKEN = os.getenv("PROFILING_ADMIN_TOKEN")
+PROFILING_SAMPLE_RATE = float(os.getenv("PROFILING_SAMPLE_RATE", "0"))
+PROFILE_DIR = os.getenv(
+    "PROFILE_DIR",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "profiles")
+)
+PROFILE_MAX_FILES = int(os.getenv("PROFILE_MAX_FILES", "200"))
+
+_PROFILE_ID_RE = re.compile(r"^[0-9a-f]{32}$")
+
+
+def is_authorized(admin_token: str = None) -> bool:
+    """Check the admin flag and, if configured, the admin token"""
+    if not PROFILING_ENABLED:
+        return False
+    return PROFILING_ADMIN_TOKEN is None or admin_token == PROFILING_ADMIN_TOKEN
+
+
+def should_profile(profile_header: str = None, admin_token: str = None) -> bool:
+    """
+    Decide whether to profile the current request
+
+    Args:
+        profile_header: Value of the X-Profile request header
+        admin_token: Value of the X-Admin-Token request header
+
+    Returns:
+        True if the request should run under the profiler
+    """
+    if not PROFILING_ENABLED:
+        return False
+    if profile_header and profile_header.lower() in ("1", "true", "yes"):
+        return is_authorized(admin_token)
+    return PROFILING_SAMPLE_RATE > 0 and random.random() < PROFILING_SAMPLE_RATE
+
+
+def describe_input(embedding_model, query: str) -> dict:
+    """
+    Record input shape and thread usage for correlating slow requests
+
+    Args:
+        embedding_model: Loaded EmbeddingModel
+        query: Query text as sent to the encoder
+
+    Returns:
+        Dictionary of query/tokenizer/thread details
+    """
+    info = {
+        "query_chars": len(query),
+        "query_words": len(query.split()),
+    }
+
+    model = getattr(embedding_model, "model", None)
+    tokenizer = getattr(model, "tokenizer", None)
+    if tokenizer is not None:
+        input_ids = tokenizer(query, add_special_tokens=True)["input_ids"]
+        info["tokenized_length"] = len(input_ids)
+        max_seq_length = getattr(model, "max_seq_length", None)
+        if max_seq_length:
+            info["max_seq_length"] = max_seq_length
+            info["truncated"] = len(input_ids) > max_seq_length
+
+    if torch is not None:
+        info["torch_num_threads"] = torch.get_num_threads()
+        info["torch_num_interop_threads"] = torch.get_num_interop_threads()
+
+    return info
+
+
+class RequestProfiler:
+    """Context manager that profiles a block and stores the artifact"""
+
+    def __init__(self, profile_dir: str = PROFILE_DIR):
+        self.profile_dir = profile_dir
+        self.profile_id = uuid.uuid4().hex
+        self.backend = "pyinstrument" if _PyinstrumentProfiler is not None else "cprofile"
+        self.elapsed = None
+        self._profiler = None
+        self._start = None
+
+    def __enter__(self):
+        if self.backend == "pyinstrument":
+            self._profiler = _PyinstrumentProfiler(async_mode="disabled")
+            self._profiler.start()
+        else:
+            self._profiler = cProfile.Profile()
+            self._profiler.enable()
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.elapsed = time.perf_counter() - self._start
+        if self.backend == "pyinstrument":
+            self._profiler.stop()
+        else:
+            self._profiler.disable()
+        return False
+
+    def save(self, metadata: dict = None) -> str:
+        """
+        Write the profile artifact and metadata JSON
+
+        Args:
+            metadata: Extra fields stored alongside the timing
+
+        Returns:
+            The profile ID
+        """
+        os.makedirs(self.profile_dir, exist_ok=True)
+
+        if self.backend == "pyinstrument":
+            artifact = f"{self.profile_id}.html"
+            with open(os.path.join(self.profile_dir, artifact), 'w') as f:
+                f.write(self._profiler.output_html())
+        else:
+            artifact = f"{self.profile_id}.pstats"
+            self._profiler.dump_stats(os.path.join(self.profile_dir, artifact))
+
+        record = {
+            "profile_id": self.profile_id,
+            "backend": self.backend,
+            "artifact": artifact,
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "elapsed_ms": round(self.elapsed * 1000.0, 3),
+        }
+        record.update(metadata or {})
+        with open(os.path.join(self.profile_dir, f"{self.profile_id}.json"), 'w') as f:
+            json.dump(record, f, indent=2)
+
+        _prune(self.profile_dir)
+        return self.profile_id
+
+
+def load_profile(profile_id: str, profile_dir: str = PROFILE_DIR) -> dict:
+    """
+    Load stored profile metadata
+
+    Returns:
+        Metadata dictionary with an absolute ``artifact_path``, or None if not found
+    """
+    if not _PROFILE_ID_RE.match(profile_id):
+        return None
+    meta_path = os.path.join(profile_dir, f"{profile_id}.json")
+    if not os.path.exists(meta_path):
+        return None
+    with open(meta_path) as f:
+        record = json.load(f)
+    record["artifact_path"] = os.path.join(profile_dir, record["artifact"])
+    return record
+
+
+def _prune(profile_dir: str):
+    """Keep only the newest PROFILE_MAX_FILES profiles"""
+    metas = [
+        os.path.join(profile_dir, name)
+        for name in os.listdir(profile_dir)
+        if name.endswith(".json")
+    ]
+    if len(metas) <= PROFILE_MAX_FILES:
+        return
+    metas.sort(key=os.path.getmtime)
+    for meta_path in metas[:len(metas) - PROFILE_MAX_FILES]:
+        stem = os.path.splitext(meta_path)[0]
+        for ext in (".json", ".html", ".pstats"):
+            if os.path.exists(stem + ext):
+                os.remove(stem + ext)
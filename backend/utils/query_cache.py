@@ -0,0 +1,129 @@
+"""
+Query result caches for /recommend
+
+Two tiers sit in front of the catalog search:
+  1. ExactQueryCache - LRU keyed by the normalized query string, checked before encoding
+  2. SemanticQueryCache - small FAISS index of recently served query embeddings,
+     checked after encoding; a neighbor above the cosine threshold reuses its ranking
+
+Both store rankings as lists of catalog row IDs, so cached entries stay small
+and are rendered into responses the same way as fresh results.
+"""
+
+import threading
+from collections import OrderedDict
+
+import faiss
+import numpy as np
+
+
+def normalize_query(query: str) -> str:
+    """Lowercase and collapse whitespace so trivially different queries share a key"""
+    return " ".join(query.lower().split())
+
+
+class ExactQueryCache:
+    """Thread-safe LRU cache from normalized query text to a ranking"""
+
+    def __init__(self, capacity: int = 1024):
+        """
+        Args:
+            capacity: Maximum number of cached queries
+        """
+        self.capacity = capacity
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, query: str):
+        """Return the cached ranking for a query, or None"""
+        key = normalize_query(query)
+        with self._lock:
+            ranking = self._entries.get(key)
+            if ranking is not None:
+                self._entries.move_to_end(key)
+            return ranking
+
+    def put(self, query: str, ranking: list):
+        """Store a ranking, evicting the least recently used entry if full"""
+        key = normalize_query(query)
+        with self._lock:
+            self._entries[key] = ranking
+            self._entries.move_to_end(key)
+            if len(self._entries) > self.capacity:
+                self._entries.popitem(last=False)
+
+
+class SemanticQueryCache:
+    """
+    Thread-safe LRU cache keyed by query embedding
+
+    Embeddings are stored in an IndexIDMap2 over IndexFlatIP so entries can
+    be removed on eviction. Lookups return the ranking of the most similar
+    cached query if its cosine similarity is at least ``threshold``.
+    """
+
+    def __init__(self, dimension: int, capacity: int = 1024, threshold: float = 0.97):
+        """
+        Args:
+            dimension: Embedding dimension
+            capacity: Maximum number of cached query vectors
+            threshold: Minimum cosine similarity for a hit
+        """
+        self.dimension = dimension
+        self.capacity = capacity
+        self.threshold = threshold
+        self._index = faiss.IndexIDMap2(faiss.IndexFlatIP(dimension))
+        self._entries = OrderedDict()
+        self._next_id = 0
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def lookup(self, query_embedding: np.ndarray) -> tuple:
+        """
+        Find a cached ranking for a normalized query embedding
+
+        Args:
+            query_embedding: Normalized float32 array of shape (1, dimension)
+
+        Returns:
+            Tuple of (ranking or None, best similarity or None)
+        """
+        with self._lock:
+            if self._index.ntotal == 0:
+                return None, None
+            similarities, ids = self._index.search(query_embedding, 1)
+            similarity, entry_id = float(similarities[0][0]), int(ids[0][0])
+            if entry_id < 0 or similarity < self.threshold:
+                return None, similarity
+            self._entries.move_to_end(entry_id)
+            return self._entries[entry_id], similarity
+
+    def add(self, query_embedding: np.ndarray, ranking: list):
+        """
+        Cache the ranking served for a query embedding
+
+        Args:
+            query_embedding: Normalized float32 array of shape (1, dimension)
+            ranking: Catalog row IDs returned for the query
+        """
+        with self._lock:
+            if len(self._entries) >= self.capacity:
+                evicted_id, _ = self._entries.popitem(last=False)
+                self._index.remove_ids(np.array([evicted_id], dtype='int64'))
+
+            entry_id = self._next_id
+            self._next_id += 1
+            self._index.add_with_ids(query_embedding, np.array([entry_id], dtype='int64'))
+            self._entries[entry_id] = ranking
+
+
+def ranking_overlap(cached: list, fresh: list) -> float:
+    """Fraction of a fresh ranking's items that the cached ranking also returned"""
+    if not fresh:
+        return 1.0
+    return len(set(cached) & set(fresh)) / len(fresh)
@@ -0,0 +1,152 @@
+"""
+Vectorized ranking metrics
+
+Computes Recall@K, Precision@K, AP@K (for MAP@K), nDCG@K and reciprocal
+rank (for MRR) for a whole query set at once from a (queries x k) matrix of
+predicted item IDs and a sparse (queries x items) relevance matrix, with
+bootstrap confidence intervals over queries.
+"""
+
+from typing import Dict, List
+
+import numpy as np
+from scipy import sparse
+
+METRICS = ("recall", "precision", "average_precision", "ndcg", "reciprocal_rank")
+
+
+def build_relevance_matrix(relevant_ids: List[List[int]], num_items: int) -> sparse.csr_matrix:
+    """
+    Build a binary sparse relevance matrix
+
+    Args:
+        relevant_ids: For each query, the IDs of its relevant items
+        num_items: Total number of item IDs
+
+    Returns:
+        Boolean CSR matrix of shape (num_queries, num_items)
+    """
+    rows = np.repeat(np.arange(len(relevant_ids)), [len(ids) for ids in relevant_ids])
+    cols = np.fromiter((i for ids in relevant_ids for i in ids), dtype=np.int64, count=len(rows))
+    matrix = sparse.csr_matrix(
+        (np.ones(len(rows), dtype=bool), (rows, cols)), shape=(len(relevant_ids), num_items)
+    )
+    matrix.sum_duplicates()
+    return matrix
+
+
+def _hit_matrix(predicted: np.ndarray, relevance: sparse.csr_matrix) -> np.ndarray:
+    """
+    Boolean (queries x k) matrix of relevant predictions
+
+    Padding (-1) never counts, and a repeated ID only counts at its first position.
+    """
+    num_queries, k = predicted.shape
+    valid = predicted >= 0
+    safe = np.where(valid, predicted, 0)
+    rows = np.repeat(np.arange(num_queries), k)
+    hits = np.asarray(relevance[rows, safe.ravel()]).reshape(num_queries, k).astype(bool) & valid
+
+    # Mask repeats: sort each row, flag equal neighbours, scatter back to original positions.
+    # Sort the original IDs so padding never looks like a repeat of item 0.
+    order = np.argsort(predicted, axis=1, kind='stable')
+    sorted_ids = np.take_along_axis(predicted, order, axis=1)
+    repeat_sorted = np.zeros_like(hits)
+    repeat_sorted[:, 1:] = (sorted_ids[:, 1:] == sorted_ids[:, :-1]) & (sorted_ids[:, 1:] >= 0)
+    repeat = np.zeros_like(hits)
+    np.put_along_axis(repeat, order, repeat_sorted, axis=1)
+
+    return hits & ~repeat
+
+
+def compute_metrics(predicted: np.ndarray, relevance: sparse.csr_matrix) -> Dict[str, np.ndarray]:
+    """
+    Per-query ranking metrics at k = predicted.shape[1]
+
+    Args:
+        predicted: int array (queries x k) of ranked item IDs, -1 for padding
+        relevance: Sparse (queries x items) relevance matrix
+
+    Returns:
+        Dictionary of metric name -> float array (queries,), plus
+        "num_relevant" and "num_retrieved" counts
+    """
+    predicted = np.asarray(predicted, dtype=np.int64)
+    num_queries, k = predicted.shape
+    hits = _hit_matrix(predicted, relevance)
+    num_relevant = np.diff(relevance.indptr).astype(np.float64)
+    has_relevant = num_relevant > 0
+    hit_counts = hits.sum(axis=1).astype(np.float64)
+    ranks = np.arange(1, k + 1, dtype=np.float64)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        recall = np.where(has_relevant, hit_counts / num_relevant, 0.0)
+        precision = hit_counts / k if k > 0 else np.zeros(num_queries)
+
+        precision_at_rank = np.cumsum(hits, axis=1) / ranks
+        ap_denominator = np.minimum(num_relevant, k)
+        average_precision = np.where(
+            has_relevant, (precision_at_rank * hits).sum(axis=1) / ap_denominator, 0.0
+        )
+
+        discounts = 1.0 / np.log2(ranks + 1.0)
+        dcg = (hits * discounts).sum(axis=1)
+        ideal_cumulative = np.concatenate([[0.0], np.cumsum(discounts)])
+        idcg = ideal_cumulative[np.minimum(num_relevant, k).astype(np.int64)]
+        ndcg = np.where(has_relevant, dcg / idcg, 0.0)
+
+    any_hit = hits.any(axis=1)
+    first_hit = hits.argmax(axis=1)
+    reciprocal_rank = np.where(any_hit, 1.0 / (first_hit + 1.0), 0.0)
+
+    return {
+        "recall": recall,
+        "precision": precision,
+        "average_precision": average_precision,
+        "ndcg": ndcg,
+        "reciprocal_rank": reciprocal_rank,
+        "num_relevant": num_relevant.astype(np.int64),
+        "num_retrieved": hit_counts.astype(np.int64),
+    }
+
+
+def bootstrap_ci(values: np.ndarray, num_samples: int = 1000, confidence: float = 0.95,
+                 seed: int = 0, chunk_size: int = 100) -> tuple:
+    """
+    Percentile bootstrap confidence interval for the mean over queries
+
+    Returns:
+        Tuple of (low, high)
+    """
+    values = np.asarray(values, dtype=np.float64)
+    if len(values) == 0:
+        return 0.0, 0.0
+    rng = np.random.default_rng(seed)
+    means = np.empty(num_samples)
+    for start in range(0, num_samples, chunk_size):
+        size = min(chunk_size, num_samples - start)
+        samples = rng.integers(0, len(values), size=(size, len(values)))
+        means[start:start + size] = values[samples].mean(axis=1)
+    alpha = (1.0 - confidence) / 2.0
+    low, high = np.quantile(means, [alpha, 1.0 - alpha])
+    return float(low), float(high)
+
+
+def summarize_metrics(per_query: Dict[str, np.ndarray], num_samples: int = 1000,
+                      confidence: float = 0.95, seed: int = 0) -> Dict[str, dict]:
+    """
+    Mean and bootstrap CI of each metric
+
+    Returns:
+        Dictionary of metric name -> {"mean", "ci_low", "ci_high"}
+    """
+    summary = {}
+    for name in METRICS:
+        values = per_query[name]
+        low, high = bootstrap_ci(values, num_samples, confidence, seed)
+        summary[name] = {
+            "mean": float(values.mean()) if len(values) > 0 else 0.0,
+            "ci_low": low,
+            "ci_high": high,
+        }
+    return summary
@@ -0,0 +1,153 @@
+"""
+Sharded catalog index with parallel scatter-gather search
+
+The catalog is partitioned into several FAISS indexes (by URL hash or by
+assessment type). A search fans out to every shard on a thread pool (FAISS
+releases the GIL while searching) and the per-shard top-k lists, which are
+already sorted, are merged with a heap. Results use global catalog row IDs
+and the same (distances, indices) shape as a FAISS index, so callers keep
+their dedup-by-URL logic unchanged.
+"""
+
+import heapq
+import itertools
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Tuple
+
+import faiss
+import numpy as np
+
+
+def partition_by_hash(assessment_data: list, num_shards: int) -> np.ndarray:
+    """
+    Assign each catalog row to a shard by a stable hash of its URL
+
+    Rows sharing a URL land in the same shard.
+
+    Returns:
+        int array of shard numbers, one per row
+    """
+    return np.array(
+        [zlib.crc32(assessment['url'].encode()) % num_shards for assessment in assessment_data],
+        dtype=np.int64
+    )
+
+
+def partition_by_type(assessment_data: list) -> np.ndarray:
+    """
+    Assign each catalog row to a shard by its assessment type (e.g. K / P)
+
+    Returns:
+        int array of shard numbers, one per row
+    """
+    types = sorted({assessment.get('type', '') for assessment in assessment_data})
+    shard_of_type = {assessment_type: shard for shard, assessment_type in enumerate(types)}
+    return np.array([shard_of_type[assessment.get('type', '')] for assessment in assessment_data], dtype=np.int64)
+
+
+class ShardedIndex:
+    """Several inner-product FAISS indexes searched in parallel as one"""
+
+    def __init__(self, shards: List[Tuple[faiss.Index, np.ndarray]], max_workers: int = None):
+        """
+        Args:
+            shards: (index, global_ids) pairs; global_ids[i] is the catalog row of vector i
+            max_workers: Search threads (defaults to one per shard)
+        """
+        if not shards:
+            raise ValueError("ShardedIndex needs at least one shard")
+        self.shards = shards
+        self.d = shards[0][0].d
+        self.ntotal = sum(index.ntotal for index, _ in shards)
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers or len(shards), thread_name_prefix="faiss-shard"
+        )
+
+    @classmethod
+    def from_vectors(cls, vectors: np.ndarray, partition: np.ndarray, max_workers: int = None):
+        """
+        Build shards from normalized vectors and a per-row shard assignment
+
+        Args:
+            vectors: float32 array (n x d)
+            partition: int array (n,) of shard numbers
+            max_workers: Search threads (defaults to one per shard)
+        """
+        shards = []
+        for shard in np.unique(partition):
+            global_ids = np.flatnonzero(partition == shard).astype(np.int64)
+            index = faiss.IndexFlatIP(vectors.shape[1])
+            index.add(np.ascontiguousarray(vectors[global_ids]))
+            shards.append((index, global_ids))
+        return cls(shards, max_workers=max_workers)
+
+    @classmethod
+    def from_index(cls, index, assessment_data: list, strategy: str = "hash",
+                   num_shards: int = 4, max_workers: int = None):
+        """
+        Split an existing flat index into shards
+
+        Args:
+            index: Flat FAISS index whose vectors can be reconstructed
+            assessment_data: Catalog rows aligned with the index
+            strategy: "hash" (by URL) or "type" (by assessment type)
+            num_shards: Shard count for the hash strategy
+            max_workers: Search threads (defaults to one per shard)
+        """
+        if strategy == "hash":
+            partition = partition_by_hash(assessment_data, num_shards)
+        elif strategy == "type":
+            partition = partition_by_type(assessment_data)
+        else:
+            raise ValueError(f"Unknown shard strategy: {strategy}")
+        vectors = index.reconstruct_n(0, index.ntotal)
+        return cls.from_vectors(vectors, partition, max_workers=max_workers)
+
+    @staticmethod
+    def _search_shard(shard: Tuple[faiss.Index, np.ndarray], queries: np.ndarray, k: int) -> tuple:
+        index, global_ids = shard
+        shard_k = min(k, index.ntotal)
+        distances, local_ids = index.search(queries, shard_k)
+        ids = np.where(local_ids >= 0, global_ids[np.maximum(local_ids, 0)], -1)
+        return distances, ids
+
+    def search(self, queries: np.ndarray, k: int) -> tuple:
+        """
+        Search all shards in parallel and merge the top-k
+
+        Args:
+            queries: Normalized float32 array (nq x d)
+            k: Results per query
+
+        Returns:
+            Tuple of (distances float32 nq x k, global ids int64 nq x k), padded with -1
+        """
+        futures = [
+            self._executor.submit(self._search_shard, shard, queries, k)
+            for shard in self.shards if shard[0].ntotal > 0
+        ]
+        shard_results = [future.result() for future in futures]
+
+        num_queries = queries.shape[0]
+        distances = np.full((num_queries, k), -np.inf, dtype=np.float32)
+        indices = np.full((num_queries, k), -1, dtype=np.int64)
+
+        for q in range(num_queries):
+            # Each shard list is already sorted by descending score
+            streams = [
+                zip(shard_distances[q], shard_ids[q])
+                for shard_distances, shard_ids in shard_results
+            ]
+            merged = heapq.merge(*streams, key=lambda hit: -hit[0])
+            for rank, (score, idx) in enumerate(itertools.islice(merged, k)):
+                if idx < 0:
+                    break
+                distances[q, rank] = score
+                indices[q, rank] = idx
+
+        return distances, indices
+
+    def close(self):
+        """Shut down the search thread pool"""
+        self._executor.shutdown(wait=False)
@@ -0,0 +1,323 @@
+"""
+Hyperparameter sweep runner built on Evaluator
+
+Encodes the labeled queries and the catalog once per model (and once per
+text template), pools duplicate catalog URLs the way build_index does,
+caches the matrices under vectorstore/cache/, then evaluates
+every combination of k, template, index backend and type filter against the
+cached matrices in parallel worker processes. Writes a Recall@K / MAP@K
+leaderboard with per-trial timing to docs/sweep_leaderboard.csv.
+
+Usage:
+  python -m utils.sweep --ks 5 10 --templates default name_description \\
+      --backends flat hnsw late_fusion --filters none K P --workers 4
+"""
+
+import argparse
+import hashlib
+import itertools
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import faiss
+import numpy as np
+import pandas as pd
+
+# Add parent directory to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from models.embedding_model import EmbeddingModel
+from utils.evaluator import Evaluator
+from utils.late_fusion import DEFAULT_FIELD_WEIGHTS, FIELDS, LateFusionScorer
+from utils.preprocess import DataPreprocessor
+from utils import ranking_metrics
+
+BACKENDS = ("flat", "hnsw", "late_fusion")
+
+# Populated in each worker process by _init_worker
+_WORKER_STATE = {}
+
+
+def _texts_hash(model_name: str, texts: list) -> str:
+    """Cache key for a model and a list of input texts"""
+    digest = hashlib.sha256(model_name.encode())
+    for text in texts:
+        digest.update(b"\0" + text.encode())
+    return digest.hexdigest()[:16]
+
+
+def _model_slug(model_name: str) -> str:
+    return model_name.replace("/", "__")
+
+
+class SweepRunner:
+    """Runs many evaluation configurations against cached embeddings"""
+
+    def __init__(self, evaluator: Evaluator = None, cache_dir: str = None):
+        """
+        Args:
+            evaluator: Evaluator providing data paths, labeled queries and metrics
+            cache_dir: Where embedding matrices are cached (defaults to vectorstore/cache)
+        """
+        self.evaluator = evaluator or Evaluator()
+        self.preprocessor = DataPreprocessor(
+            embedding_model=self.evaluator.embedding_model,
+            data_dir=self.evaluator.data_dir,
+            vectorstore_dir=self.evaluator.vectorstore_dir
+        )
+        self.cache_dir = cache_dir or os.path.join(self.evaluator.vectorstore_dir, "cache")
+        self._models = {}
+
+    def _get_model(self, model_name: str):
+        """Reuse the evaluator's encoder for its own model, load others on demand"""
+        default_model = self.evaluator.embedding_model
+        if model_name == getattr(default_model, 'model_name', None):
+            return default_model
+        if model_name not in self._models:
+            self._models[model_name] = EmbeddingModel(model_name)
+        return self._models[model_name]
+
+    def _cached_encode(self, model_name: str, name: str, texts: list) -> str:
+        """
+        Encode texts once per model and cache as a normalized float32 .npy
+
+        Returns:
+            Path of the cached matrix
+        """
+        model_dir = os.path.join(self.cache_dir, _model_slug(model_name))
+        os.makedirs(model_dir, exist_ok=True)
+        path = os.path.join(model_dir, f"{name}-{_texts_hash(model_name, texts)}.npy")
+        if not os.path.exists(path):
+            print(f"Encoding {len(texts)} texts for {name} with {model_name}...")
+            matrix = np.ascontiguousarray(self._get_model(model_name).encode_batch(texts), dtype='float32')
+            faiss.normalize_L2(matrix)
+            tmp_path = path + ".tmp.npy"
+            np.save(tmp_path, matrix)
+            os.replace(tmp_path, path)
+        return path
+
+    def _cached_pool(self, path: str, groups: list) -> str:
+        """
+        Pool a cached matrix over URL groups the way build_index does, caching the result
+
+        Returns:
+            Path of the pooled matrix (the input path if no URL is duplicated)
+        """
+        if all(len(group) == 1 for group in groups):
+            return path
+        digest = hashlib.sha256(self.preprocessor.URL_GROUP_POOLING.encode())
+        for group in groups:
+            digest.update(f"{group};".encode())
+        pooled_path = f"{path[:-len('.npy')]}-urlgroups-{digest.hexdigest()[:12]}.npy"
+        if not os.path.exists(pooled_path):
+            pooled = self.preprocessor.pool_groups(np.load(path), groups)
+            tmp_path = pooled_path + ".tmp.npy"
+            np.save(tmp_path, pooled)
+            os.replace(tmp_path, pooled_path)
+        return pooled_path
+
+    def prepare(self, models: list, templates: list, need_fields: bool) -> dict:
+        """
+        Encode and cache every matrix the sweep needs
+
+        Returns:
+            Shared state for workers: matrix paths, catalog metadata and ground truth
+        """
+        query_to_urls = self.evaluator.load_labeled_queries()
+        if len(query_to_urls) == 0:
+            raise ValueError("No labeled queries found; cannot run a sweep")
+        queries = list(query_to_urls.keys())
+
+        catalog_df = self.preprocessor.load_catalog()
+        field_texts = self.preprocessor.prepare_field_texts(catalog_df) if need_fields else None
+
+        # Trials search one pooled vector per URL, like the served index
+        url_groups = self.preprocessor.group_by_url(catalog_df)
+        grouped_df = catalog_df.iloc[[group[0] for group in url_groups]].reset_index(drop=True)
+
+        paths = {}
+        for model_name in models:
+            paths[(model_name, "queries")] = self._cached_encode(model_name, "queries", queries)
+            for template in templates:
+                texts = self.preprocessor.prepare_assessment_texts(
+                    catalog_df, DataPreprocessor.TEXT_TEMPLATES[template]
+                )
+                paths[(model_name, f"catalog:{template}")] = self._cached_pool(
+                    self._cached_encode(model_name, f"catalog-{template}", texts), url_groups
+                )
+            if need_fields:
+                for field in FIELDS:
+                    paths[(model_name, f"field:{field}")] = self._cached_pool(
+                        self._cached_encode(model_name, f"field-{field}", field_texts[field]), url_groups
+                    )
+
+        urls = grouped_df['url'].astype(str).tolist()
+        row_to_url_id, relevance, _ = Evaluator.build_url_ids(
+            [{'url': url} for url in urls], [query_to_urls[query] for query in queries]
+        )
+
+        return {
+            "paths": paths,
+            "types": grouped_df['type'].astype(str).tolist() if 'type' in grouped_df else [''] * len(grouped_df),
+            "row_to_url_id": row_to_url_id,
+            "relevance": relevance,
+        }
+
+    def build_trials(self, models: list, templates: list, ks: list, backends: list,
+                     filters: list, fusion_weights: list) -> list:
+        """Expand the configuration grid into a list of trial dictionaries"""
+        trials = []
+        for model_name, k, type_filter, backend in itertools.product(models, ks, filters, backends):
+            if backend == "late_fusion":
+                for weights in fusion_weights:
+                    trials.append({"model": model_name, "template": "fields", "k": k,
+                                   "backend": backend, "filter": type_filter, "weights": weights})
+            else:
+                for template in templates:
+                    trials.append({"model": model_name, "template": template, "k": k,
+                                   "backend": backend, "filter": type_filter, "weights": None})
+        return trials
+
+    def run(self, models: list = None, templates: list = None, ks: list = None, backends: list = None,
+            filters: list = None, fusion_weights: list = None, workers: int = None) -> pd.DataFrame:
+        """
+        Run the sweep and write the leaderboard
+
+        Returns:
+            Leaderboard DataFrame sorted by MAP@K then Recall@K
+        """
+        models = models or [getattr(self.evaluator.embedding_model, 'model_name', 'all-MiniLM-L6-v2')]
+        templates = templates or ["default"]
+        ks = ks or [10]
+        backends = backends or ["flat"]
+        filters = filters or [None]
+        fusion_weights = fusion_weights or [DEFAULT_FIELD_WEIGHTS]
+
+        unknown = set(backends) - set(BACKENDS)
+        if unknown:
+            raise ValueError(f"Unknown backends {sorted(unknown)}; choose from {list(BACKENDS)}")
+
+        start = time.perf_counter()
+        state = self.prepare(models, templates, need_fields="late_fusion" in backends)
+        prepare_seconds = time.perf_counter() - start
+        print(f"Embedding cache ready in {prepare_seconds:.1f}s")
+
+        trials = self.build_trials(models, templates, ks, backends, filters, fusion_weights)
+        print(f"Running {len(trials)} trials on {workers or os.cpu_count()} workers...")
+
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(state,)) as pool:
+            rows = list(pool.map(_run_trial, trials))
+
+        leaderboard = pd.DataFrame(rows).sort_values(
+            ["map_at_k", "recall_at_k"], ascending=False
+        ).reset_index(drop=True)
+
+        leaderboard_path = os.path.join(self.evaluator.docs_dir, "sweep_leaderboard.csv")
+        os.makedirs(os.path.dirname(leaderboard_path), exist_ok=True)
+        leaderboard.to_csv(leaderboard_path, index=False)
+
+        print(f"\nSweep finished in {time.perf_counter() - start:.1f}s")
+        print(leaderboard.head(10).to_string(index=False))
+        print(f"Leaderboard saved to {leaderboard_path}")
+        return leaderboard
+
+
+def _init_worker(state: dict):
+    """Memory-map the cached matrices once per worker process"""
+    _WORKER_STATE.clear()
+    _WORKER_STATE.update(state)
+    _WORKER_STATE["matrices"] = {key: np.load(path, mmap_mode='r') for key, path in state["paths"].items()}
+    # One FAISS thread per worker; parallelism comes from the process pool
+    faiss.omp_set_num_threads(1)
+
+
+def _search(backend: str, catalog: np.ndarray, queries: np.ndarray, k: int) -> np.ndarray:
+    """Build an index of the requested backend over catalog and return top-k row ids"""
+    catalog = np.ascontiguousarray(catalog, dtype='float32')
+    if backend == "hnsw":
+        index = faiss.IndexHNSWFlat(catalog.shape[1], 32, faiss.METRIC_INNER_PRODUCT)
+    else:
+        index = faiss.IndexFlatIP(catalog.shape[1])
+    index.add(catalog)
+    distances, indices = index.search(np.ascontiguousarray(queries, dtype='float32'), min(k, index.ntotal))
+    return indices
+
+
+def _run_trial(trial: dict) -> dict:
+    """Evaluate one configuration against the cached matrices"""
+    matrices = _WORKER_STATE["matrices"]
+    row_to_url_id = _WORKER_STATE["row_to_url_id"]
+    model_name, k = trial["model"], trial["k"]
+
+    start = time.perf_counter()
+    queries = matrices[(model_name, "queries")]
+
+    rows = np.arange(len(row_to_url_id))
+    if trial["filter"]:
+        rows = np.flatnonzero(np.array(_WORKER_STATE["types"]) == trial["filter"])
+
+    if len(rows) == 0:
+        indices = np.full((len(queries), k), -1)
+    elif trial["backend"] == "late_fusion":
+        field_embeddings = np.stack([matrices[(model_name, f"field:{field}")][rows] for field in FIELDS])
+        scorer = LateFusionScorer(FIELDS, field_embeddings)
+        distances, indices = scorer.search(np.asarray(queries, dtype='float32'), k, trial["weights"])
+    else:
+        catalog = matrices[(model_name, f"catalog:{trial['template']}")][rows]
+        indices = _search(trial["backend"], catalog, queries, k)
+    search_seconds = time.perf_counter() - start
+
+    # Pad to k, map filtered positions back to catalog rows, then to URL IDs
+    predicted_rows = np.full((len(queries), k), -1, dtype=np.int64)
+    predicted_rows[:, :indices.shape[1]] = np.where(indices >= 0, rows[np.maximum(indices, 0)], -1)
+    predicted = Evaluator.rows_to_url_ids(predicted_rows, row_to_url_id)
+    per_query = ranking_metrics.compute_metrics(predicted, _WORKER_STATE["relevance"])
+
+    return {
+        "model": model_name,
+        "template": trial["template"],
+        "backend": trial["backend"],
+        "weights": json.dumps(trial["weights"]) if trial["weights"] else "",
+        "filter": trial["filter"] or "none",
+        "k": k,
+        "recall_at_k": float(per_query["recall"].mean()),
+        "map_at_k": float(per_query["average_precision"].mean()),
+        "ndcg_at_k": float(per_query["ndcg"].mean()),
+        "mrr": float(per_query["reciprocal_rank"].mean()),
+        "num_queries": len(predicted),
+        "trial_seconds": round(time.perf_counter() - start, 4),
+        "search_seconds": round(search_seconds, 4),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Sweep retrieval configurations against cached embeddings")
+    parser.add_argument("--models", nargs="+", help="Sentence-BERT model names (default: evaluator model)")
+    parser.add_argument("--templates", nargs="+", default=["default"],
+                        choices=sorted(DataPreprocessor.TEXT_TEMPLATES), help="Catalog text templates")
+    parser.add_argument("--ks", nargs="+", type=int, default=[10], help="Cutoffs to evaluate")
+    parser.add_argument("--backends", nargs="+", default=["flat"], choices=BACKENDS, help="Index backends")
+    parser.add_argument("--filters", nargs="+", default=["none"],
+                        help="Assessment type filters (none, K, P)")
+    parser.add_argument("--fusion-weights", nargs="+", type=json.loads,
+                        help='Late-fusion weight sets as JSON, e.g. \'{"name": 0.3, "description": 0.7}\'')
+    parser.add_argument("--workers", type=int, help="Worker processes (default: CPU count)")
+    args = parser.parse_args()
+
+    filters = [None if f.lower() == "none" else f for f in args.filters]
+    SweepRunner().run(
+        models=args.models,
+        templates=args.templates,
+        ks=args.ks,
+        backends=args.backends,
+        filters=filters,
+        fusion_weights=args.fusion_weights,
+        workers=args.workers,
+    )
+
+
+if __name__ == "__main__":
+    main()
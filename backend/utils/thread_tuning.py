@@ -0,0 +1,313 @@
+"""
+CPU thread tuning for torch and FAISS
+
+Benchmarks combinations of uvicorn worker count, torch intra-op threads and
+FAISS OpenMP threads on the actual host (never more threads in total than
+cores), picks the fastest one that keeps p95 latency close to the best, and
+records it as vectorstore/thread_profile.json. Each API worker applies the
+profile at startup.
+
+Each candidate runs in W spawned processes that load the encoder and the
+active bundle, then send single-query encode + search requests back to back
+for a fixed duration, the same way W uvicorn workers would share the cores.
+
+Usage:
+  python -m utils.thread_tuning                     # tune and write the profile
+  python -m utils.thread_tuning --duration 5 --max-workers 4
+
+Environment:
+  THREAD_AUTOTUNE=1       tune at API startup if no profile exists yet
+  TORCH_NUM_THREADS / FAISS_NUM_THREADS override the profile
+
+Startup tuning runs inside the startup hook: the tuning worker serves
+nothing, including /health, until the sweep finishes, and the other
+workers wait on its lock. Prefer running the CLI before uvicorn starts
+(e.g. in the container entrypoint) where health checks have a deadline.
+"""
+
+import argparse
+import fcntl
+import json
+import multiprocessing
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import faiss
+import numpy as np
+import torch
+
+# Add parent directory to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils import vectorstore
+from utils.evaluator import load_query_corpus
+
+PROFILE_NAME = "thread_profile.json"
+DEFAULT_VECTORSTORE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "vectorstore")
+DEFAULT_DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data")
+
+# Settings applied in this process, reported by the API
+_applied = {}
+
+# Populated in each benchmark process by _init_worker
+_WORKER_STATE = {}
+
+
+def available_cores() -> int:
+    """CPU cores this process may run on (respects affinity masks and cpusets)"""
+    if hasattr(os, "sched_getaffinity"):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+
+def _powers_of_two(limit: int) -> list:
+    values = []
+    value = 1
+    while value <= limit:
+        values.append(value)
+        value *= 2
+    return values
+
+
+def candidate_configs(cores: int, max_workers: int = None) -> list:
+    """
+    Thread combinations to benchmark
+
+    Worker counts and torch threads are powers of two with
+    workers * torch_threads <= cores; FAISS gets either one thread or as
+    many as torch, since a flat search over the catalog is short.
+
+    Returns:
+        List of {"workers", "torch_threads", "faiss_threads"} dictionaries
+    """
+    configs = []
+    for workers in _powers_of_two(min(cores, max_workers or cores)):
+        for torch_threads in _powers_of_two(cores // workers):
+            for faiss_threads in sorted({1, torch_threads}):
+                configs.append({
+                    "workers": workers,
+                    "torch_threads": torch_threads,
+                    "faiss_threads": faiss_threads,
+                })
+    return configs
+
+
+def _init_worker(config: dict, vectorstore_dir: str, barrier):
+    """Load the encoder and index with the candidate thread counts"""
+    torch.set_num_threads(config["torch_threads"])
+    faiss.omp_set_num_threads(config["faiss_threads"])
+
+    from models.embedding_model import EmbeddingModel
+    model = EmbeddingModel()
+    bundle = vectorstore.load_bundle(vectorstore_dir, expected_model=model.model_name)
+    if bundle is None:
+        raise RuntimeError(f"No vectorstore bundle in {vectorstore_dir}; build the index first")
+
+    _WORKER_STATE.clear()
+    _WORKER_STATE.update({"model": model, "index": bundle.index, "barrier": barrier})
+
+
+def _run_worker(args: tuple) -> list:
+    """Serve queries back to back for `duration` seconds; return latencies"""
+    queries, offset, warmup, duration = args
+    model = _WORKER_STATE["model"]
+    index = _WORKER_STATE["index"]
+    k = min(10, index.ntotal)
+
+    def serve(query):
+        embedding = np.ascontiguousarray(model.encode([query]), dtype='float32')
+        faiss.normalize_L2(embedding)
+        index.search(embedding, k)
+
+    for i in range(warmup):
+        serve(queries[(offset + i) % len(queries)])
+
+    # Start measuring only once every worker has loaded and warmed up
+    _WORKER_STATE["barrier"].wait()
+    latencies = []
+    i = offset
+    deadline = time.perf_counter() + duration
+    while time.perf_counter() < deadline:
+        start = time.perf_counter()
+        serve(queries[i % len(queries)])
+        latencies.append(time.perf_counter() - start)
+        i += 1
+    return latencies
+
+
+def benchmark_config(config: dict, queries: list, vectorstore_dir: str = None,
+                     duration: float = 10.0, warmup: int = 5) -> dict:
+    """
+    Measure throughput and latency of one configuration
+
+    Returns:
+        The config extended with throughput_rps, latency_p50_ms and latency_p95_ms
+    """
+    workers = config["workers"]
+    context = multiprocessing.get_context("spawn")
+    barrier = context.Barrier(workers)
+    with ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=context,
+        initializer=_init_worker,
+        initargs=(config, vectorstore_dir or DEFAULT_VECTORSTORE_DIR, barrier),
+    ) as pool:
+        offsets = [w * len(queries) // workers for w in range(workers)]
+        runs = list(pool.map(_run_worker, [(queries, offset, warmup, duration) for offset in offsets]))
+
+    latencies = np.concatenate([np.array(run) for run in runs]) * 1000.0
+    p50, p95 = np.percentile(latencies, [50, 95]) if len(latencies) else (0.0, 0.0)
+    result = dict(config)
+    result.update({
+        "throughput_rps": round(len(latencies) / duration, 2),
+        "latency_p50_ms": round(float(p50), 3),
+        "latency_p95_ms": round(float(p95), 3),
+    })
+    return result
+
+
+def select_best(results: list, latency_slack: float = 0.5) -> dict:
+    """
+    Highest-throughput result whose p95 is within `latency_slack` of the best p95
+
+    Trading a little throughput for bounded tail latency avoids picking the
+    configuration that saturates every core at the cost of queueing.
+    """
+    best_p95 = min(result["latency_p95_ms"] for result in results)
+    eligible = [r for r in results if r["latency_p95_ms"] <= best_p95 * (1.0 + latency_slack)]
+    return max(eligible, key=lambda r: (r["throughput_rps"], -r["latency_p95_ms"]))
+
+
+def autotune(vectorstore_dir: str = None, queries: list = None, duration: float = 10.0,
+             max_workers: int = None, latency_slack: float = 0.5) -> dict:
+    """
+    Benchmark candidate configurations and write the thread profile
+
+    Returns:
+        The written profile
+    """
+    vectorstore_dir = vectorstore_dir or DEFAULT_VECTORSTORE_DIR
+    queries = queries or load_query_corpus(DEFAULT_DATA_DIR)
+    cores = available_cores()
+    configs = candidate_configs(cores, max_workers)
+    print(f"Tuning threads on {cores} cores: {len(configs)} configurations, {duration:.0f}s each...")
+
+    results = []
+    for config in configs:
+        result = benchmark_config(config, queries, vectorstore_dir, duration)
+        print(f"  workers={result['workers']} torch={result['torch_threads']} faiss={result['faiss_threads']}: "
+              f"{result['throughput_rps']:.1f} req/s, p95 {result['latency_p95_ms']:.1f} ms")
+        results.append(result)
+
+    best = select_best(results, latency_slack)
+    profile = {
+        "workers": best["workers"],
+        "torch_threads": best["torch_threads"],
+        "faiss_threads": best["faiss_threads"],
+        "cores": cores,
+        "tuned_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "results": results,
+    }
+
+    path = os.path.join(vectorstore_dir, PROFILE_NAME)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(profile, f, indent=2)
+    os.replace(tmp_path, path)
+
+    print(f"Selected workers={best['workers']} torch_threads={best['torch_threads']} "
+          f"faiss_threads={best['faiss_threads']}; profile saved to {path}")
+    return profile
+
+
+def load_profile(vectorstore_dir: str = None) -> dict:
+    """
+    Load the thread profile if it was tuned on a host with the same core count
+
+    Returns:
+        Profile dictionary, or None if absent or tuned for a different host
+    """
+    path = os.path.join(vectorstore_dir or DEFAULT_VECTORSTORE_DIR, PROFILE_NAME)
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        profile = json.load(f)
+    if profile.get("cores") != available_cores():
+        print(f"Warning: ignoring thread profile tuned for {profile.get('cores')} cores "
+              f"(this host has {available_cores()}). Re-run utils.thread_tuning.")
+        return None
+    return profile
+
+
+def _tune_once(vectorstore_dir: str) -> dict:
+    """Autotune under a file lock so only one of several starting workers benchmarks"""
+    lock_path = os.path.join(vectorstore_dir, PROFILE_NAME + ".lock")
+    with open(lock_path, 'w') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            return load_profile(vectorstore_dir) or autotune(vectorstore_dir)
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
+
+
+def apply_thread_settings(vectorstore_dir: str = None) -> dict:
+    """
+    Apply torch and FAISS thread counts for this process
+
+    TORCH_NUM_THREADS / FAISS_NUM_THREADS take precedence, then the thread
+    profile; with THREAD_AUTOTUNE=1 a missing profile is tuned first
+    (once an index has been built). Tuning blocks the caller for the whole
+    sweep, so an API worker fails health checks until it is done.
+    Otherwise library defaults are left in place.
+
+    Returns:
+        Applied settings, including where they came from
+    """
+    vectorstore_dir = vectorstore_dir or DEFAULT_VECTORSTORE_DIR
+    profile = load_profile(vectorstore_dir)
+    if profile is None and os.getenv("THREAD_AUTOTUNE", "").lower() in ("1", "true", "yes"):
+        if vectorstore.bundle_exists(vectorstore_dir):
+            profile = _tune_once(vectorstore_dir)
+        else:
+            print("Warning: THREAD_AUTOTUNE needs a built index; using library thread defaults.")
+
+    torch_threads = os.getenv("TORCH_NUM_THREADS")
+    faiss_threads = os.getenv("FAISS_NUM_THREADS")
+    source = "env" if torch_threads or faiss_threads else "profile" if profile else "default"
+
+    if torch_threads or profile:
+        torch.set_num_threads(int(torch_threads or profile["torch_threads"]))
+    if faiss_threads or profile:
+        faiss.omp_set_num_threads(int(faiss_threads or profile["faiss_threads"]))
+
+    _applied.clear()
+    _applied.update({
+        "source": source,
+        "torch_threads": torch.get_num_threads(),
+        "faiss_threads": faiss.omp_get_max_threads(),
+        "recommended_workers": profile["workers"] if profile else None,
+        "cores": available_cores(),
+    })
+    return dict(_applied)
+
+
+def current_settings() -> dict:
+    """Settings applied by apply_thread_settings, or {} before startup"""
+    return dict(_applied)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Tune torch/FAISS threads and worker count for this host")
+    parser.add_argument("--duration", type=float, default=10.0, help="Measurement seconds per configuration")
+    parser.add_argument("--max-workers", type=int, help="Largest worker count to try (default: cores)")
+    parser.add_argument("--latency-slack", type=float, default=0.5,
+                        help="Allowed p95 above the best p95 when maximizing throughput (default 0.5)")
+    args = parser.parse_args()
+
+    autotune(duration=args.duration, max_workers=args.max_workers, latency_slack=args.latency_slack)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,319 @@
+"""
+Versioned, self-describing vectorstore bundles
+
+Layout under the vectorstore directory:
+
+  CURRENT                      name of the active bundle (replaced atomically)
+  bundles/<version>/
+      manifest.json            model, dimension, count, build params, file sizes and checksums
+      faiss_index.bin
+      assessment_data.pkl
+      ...                      any further build artifacts (e.g. neighbors.npz)
+
+Bundles are written into a temporary directory and renamed into place, then
+CURRENT is swapped with os.replace, so readers only ever see complete
+bundles. Startup validation is O(1): it compares manifest fields against the
+loaded index and file sizes against os.stat. Full checksum verification is
+opt-in (VECTORSTORE_VERIFY=full) because it reads every byte.
+
+Indexes built before bundles existed (loose faiss_index.bin and
+assessment_data.pkl in the vectorstore directory) are still loaded, with a
+count check in place of the manifest.
+"""
+
+import hashlib
+import json
+import os
+import pickle
+import shutil
+import time
+import uuid
+
+import faiss
+import numpy as np
+
+FORMAT_VERSION = 1
+MANIFEST_NAME = "manifest.json"
+CURRENT_NAME = "CURRENT"
+BUNDLES_DIR = "bundles"
+INDEX_FILE = "faiss_index.bin"
+DATA_FILE = "assessment_data.pkl"
+
+# How many bundles to keep on disk after a successful build
+KEEP_BUNDLES = int(os.getenv("VECTORSTORE_KEEP_BUNDLES", "3"))
+# Staging directories older than this (seconds) are treated as abandoned
+STAGING_MAX_AGE = 3600
+# "fast" (size and manifest checks) or "full" (also verify sha256 checksums)
+VERIFY_MODE = os.getenv("VECTORSTORE_VERIFY", "fast")
+
+
+class BundleError(ValueError):
+    """Raised when a vectorstore bundle is missing pieces or inconsistent"""
+
+
+def file_sha256(path: str, chunk_size: int = 1 << 20) -> str:
+    """Stream a file through sha256"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _fsync_path(path: str):
+    """Flush a file or directory to disk"""
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+class BundleWriter:
+    """
+    Stages build artifacts and publishes them as one bundle
+
+    Usage:
+        writer = BundleWriter(vectorstore_dir)
+        faiss.write_index(index, writer.path("faiss_index.bin"))
+        ...
+        version = writer.commit(model_name=..., dimension=..., count=..., build_params={...})
+    """
+
+    def __init__(self, vectorstore_dir: str):
+        self.vectorstore_dir = vectorstore_dir
+        self.bundles_dir = os.path.join(vectorstore_dir, BUNDLES_DIR)
+        self.staging_dir = os.path.join(self.bundles_dir, f".tmp-{uuid.uuid4().hex}")
+        os.makedirs(self.staging_dir)
+
+    def path(self, name: str) -> str:
+        """Path inside the staging directory for an artifact"""
+        return os.path.join(self.staging_dir, name)
+
+    def abort(self):
+        """Discard the staged files"""
+        shutil.rmtree(self.staging_dir, ignore_errors=True)
+
+    def commit(self, model_name: str, dimension: int, count: int, build_params: dict = None) -> str:
+        """
+        Write the manifest, move the bundle into place and make it current
+
+        Args:
+            model_name: Embedding model used to build the index
+            dimension: Embedding dimension
+            count: Number of catalog rows / index vectors
+            build_params: Free-form build settings recorded in the manifest
+
+        Returns:
+            The new bundle version
+        """
+        files = {}
+        for name in sorted(os.listdir(self.staging_dir)):
+            path = self.path(name)
+            _fsync_path(path)
+            files[name] = {"size": os.path.getsize(path), "sha256": file_sha256(path)}
+
+        for required in (INDEX_FILE, DATA_FILE):
+            if required not in files:
+                self.abort()
+                raise BundleError(f"Bundle is missing {required}")
+
+        content_hash = hashlib.sha256(
+            "".join(f"{name}:{info['sha256']}" for name, info in files.items()).encode()
+        ).hexdigest()
+        # Microsecond timestamp plus a random suffix: rebuilding the same
+        # catalog twice in one second must not reuse a bundle directory
+        now = time.time()
+        version = (
+            f"{time.strftime('%Y%m%dT%H%M%S', time.localtime(now))}.{int(now % 1 * 1e6):06d}"
+            f"-{content_hash[:12]}-{uuid.uuid4().hex[:6]}"
+        )
+
+        manifest = {
+            "format_version": FORMAT_VERSION,
+            "version": version,
+            "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "model_name": model_name,
+            "dimension": int(dimension),
+            "count": int(count),
+            "build_params": build_params or {},
+            "files": files,
+        }
+        manifest_path = self.path(MANIFEST_NAME)
+        with open(manifest_path, 'w') as f:
+            json.dump(manifest, f, indent=2)
+            f.flush()
+            os.fsync(f.fileno())
+
+        bundle_dir = os.path.join(self.bundles_dir, version)
+        try:
+            os.rename(self.staging_dir, bundle_dir)
+        except OSError:
+            self.abort()
+            raise
+        _fsync_path(self.bundles_dir)
+
+        current_tmp = os.path.join(self.vectorstore_dir, f".{CURRENT_NAME}.tmp")
+        with open(current_tmp, 'w') as f:
+            f.write(version)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(current_tmp, os.path.join(self.vectorstore_dir, CURRENT_NAME))
+        _fsync_path(self.vectorstore_dir)
+
+        _prune_bundles(self.bundles_dir, keep=version)
+        return version
+
+
+def _prune_bundles(bundles_dir: str, keep: str):
+    """Remove stale staging dirs and all but the newest KEEP_BUNDLES bundles"""
+    names = sorted(os.listdir(bundles_dir))
+
+    # Staging dirs left by crashed builds; recent ones may belong to a build in progress
+    cutoff = time.time() - STAGING_MAX_AGE
+    for name in names:
+        path = os.path.join(bundles_dir, name)
+        if name.startswith(".tmp-") and os.path.getmtime(path) < cutoff:
+            shutil.rmtree(path, ignore_errors=True)
+
+    published = [name for name in names if not name.startswith(".")]
+    stale = published[:-KEEP_BUNDLES] if KEEP_BUNDLES > 0 else []
+    for name in stale:
+        if name != keep:
+            shutil.rmtree(os.path.join(bundles_dir, name), ignore_errors=True)
+
+
+class VectorstoreBundle:
+    """A loaded FAISS index, its assessment data and the bundle manifest"""
+
+    def __init__(self, path: str, manifest: dict, index, assessment_data: list):
+        self.path = path
+        self.manifest = manifest
+        self.index = index
+        self.assessment_data = assessment_data
+
+    @property
+    def version(self) -> str:
+        """Bundle version, or 'legacy' for pre-bundle indexes"""
+        return self.manifest["version"] if self.manifest else "legacy"
+
+    @property
+    def build_params(self) -> dict:
+        return self.manifest.get("build_params", {}) if self.manifest else {}
+
+    def file_path(self, name: str) -> str:
+        """Path of an artifact in this bundle, or None if it is absent"""
+        path = os.path.join(self.path, name)
+        return path if os.path.exists(path) else None
+
+    def load_arrays(self, name: str) -> dict:
+        """
+        Load an .npz artifact fully into memory
+
+        Returns:
+            Dictionary of arrays, or None if the artifact is absent
+        """
+        path = self.file_path(name)
+        if path is None:
+            return None
+        with np.load(path) as arrays:
+            return {key: arrays[key] for key in arrays.files}
+
+
+def current_bundle_dir(vectorstore_dir: str) -> str:
+    """Resolve the active bundle directory, or None if no bundle has been published"""
+    current_path = os.path.join(vectorstore_dir, CURRENT_NAME)
+    if not os.path.exists(current_path):
+        return None
+    with open(current_path) as f:
+        version = f.read().strip()
+    bundle_dir = os.path.join(vectorstore_dir, BUNDLES_DIR, version)
+    if not os.path.isdir(bundle_dir):
+        raise BundleError(f"CURRENT points to missing bundle {version}")
+    return bundle_dir
+
+
+def bundle_exists(vectorstore_dir: str) -> bool:
+    """True if a bundle or a legacy loose index is present"""
+    if os.path.exists(os.path.join(vectorstore_dir, CURRENT_NAME)):
+        return True
+    return (os.path.exists(os.path.join(vectorstore_dir, INDEX_FILE))
+            and os.path.exists(os.path.join(vectorstore_dir, DATA_FILE)))
+
+
+def validate_manifest(manifest: dict, bundle_dir: str, verify: str = None):
+    """
+    Check that the files on disk match the manifest
+
+    The default ("fast") mode only stats files; "full" also recomputes checksums.
+    """
+    verify = verify or VERIFY_MODE
+    if manifest.get("format_version") != FORMAT_VERSION:
+        raise BundleError(
+            f"Unsupported bundle format {manifest.get('format_version')} (expected {FORMAT_VERSION})"
+        )
+    for name, info in manifest["files"].items():
+        path = os.path.join(bundle_dir, name)
+        if not os.path.exists(path):
+            raise BundleError(f"Bundle file {name} is missing")
+        if os.path.getsize(path) != info["size"]:
+            raise BundleError(f"Bundle file {name} has size {os.path.getsize(path)}, expected {info['size']}")
+        if verify == "full" and file_sha256(path) != info["sha256"]:
+            raise BundleError(f"Bundle file {name} failed checksum verification")
+
+
+def load_bundle(vectorstore_dir: str, expected_model: str = None, verify: str = None) -> VectorstoreBundle:
+    """
+    Load and validate the active vectorstore bundle
+
+    Args:
+        vectorstore_dir: Vectorstore directory
+        expected_model: Embedding model the caller will encode queries with
+        verify: "fast" or "full" (defaults to VECTORSTORE_VERIFY)
+
+    Returns:
+        VectorstoreBundle, or None if nothing has been built yet
+
+    Raises:
+        BundleError: if the bundle is incomplete or inconsistent
+    """
+    bundle_dir = current_bundle_dir(vectorstore_dir)
+
+    if bundle_dir is None:
+        index_path = os.path.join(vectorstore_dir, INDEX_FILE)
+        data_path = os.path.join(vectorstore_dir, DATA_FILE)
+        if not (os.path.exists(index_path) and os.path.exists(data_path)):
+            return None
+        print(f"Warning: loading legacy unversioned index from {vectorstore_dir}. Rebuild to create a bundle.")
+        index = faiss.read_index(index_path)
+        with open(data_path, 'rb') as f:
+            assessment_data = pickle.load(f)
+        if index.ntotal != len(assessment_data):
+            raise BundleError(
+                f"Index has {index.ntotal} vectors but assessment data has {len(assessment_data)} rows"
+            )
+        return VectorstoreBundle(vectorstore_dir, None, index, assessment_data)
+
+    with open(os.path.join(bundle_dir, MANIFEST_NAME)) as f:
+        manifest = json.load(f)
+    validate_manifest(manifest, bundle_dir, verify)
+
+    if expected_model is not None and manifest["model_name"] != expected_model:
+        raise BundleError(
+            f"Bundle {manifest['version']} was built with {manifest['model_name']}, "
+            f"but queries are encoded with {expected_model}"
+        )
+
+    index = faiss.read_index(os.path.join(bundle_dir, INDEX_FILE))
+    with open(os.path.join(bundle_dir, DATA_FILE), 'rb') as f:
+        assessment_data = pickle.load(f)
+
+    if index.d != manifest["dimension"]:
+        raise BundleError(f"Index dimension {index.d} does not match manifest {manifest['dimension']}")
+    if index.ntotal != manifest["count"] or len(assessment_data) != manifest["count"]:
+        raise BundleError(
+            f"Manifest count {manifest['count']} does not match index ({index.ntotal}) "
+            f"or assessment data ({len(assessment_data)})"
+        )
+
+    return VectorstoreBundle(bundle_dir, manifest, index, assessment_data)